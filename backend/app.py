@@ -1,18 +1,22 @@
-from flask import Flask, jsonify, request
-from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager, get_jwt_identity, verify_jwt_in_request
+from flask import Flask, jsonify, request, g
+from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 import click
-import os
 
-from models import db, User, Warehouse
+from models import db, rebuild_expense_rollup
 from config import Config
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from slow_queries import init_slow_query_log
+from profiling import init_profiling
+from bootstrap import bootstrap_database, sync_default_users
+from startup import LazyAppGroup, start_warmup
 
 # Import blueprints
 from routes.auth import auth_bp
 from routes.products import products_bp
 from routes.sales import sales_bp
-from routes.customers import customers_bp
+from routes.customers import customers_bp, link_sales_to_customers
 from routes.stock_intake import stock_intake_bp
 from routes.expenses import expenses_bp
 from routes.warehouses import warehouses_bp
@@ -20,15 +24,28 @@ from routes.warehouses import warehouses_bp
 # from routes.user import user_bp
 # from routes.dashboard import dashboard_bp
 from routes.catalog import catalog_bp
-# from routes.timeline import timeline_bp
+from routes.reports import reports_bp
+from routes.timeline import timeline_bp
+from routes.admin import admin_bp
+from routes.utils import verify_request_jwt
+
+def _init_migrate(app):
+    from flask_migrate import Migrate
+    Migrate(app, db)
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.cli = LazyAppGroup(app.name)
 
     db.init_app(app)
-    Migrate(app, db)
+    # Flask-Migrate imports alembic; only `flask db ...` needs it
+    app.cli.add_lazy_command('db', lambda: _init_migrate(app))
     JWTManager(app)
+    init_instrumentation(app)
+    init_metrics(app)
+    init_slow_query_log(app)
+    init_profiling(app)
     
     # CORS configuration - allow all origins for development
     CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -45,160 +62,75 @@ def create_app():
     # app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
     app.register_blueprint(catalog_bp, url_prefix='/api/catalog')
     app.register_blueprint(warehouses_bp, url_prefix='/api/warehouses')
-    # app.register_blueprint(timeline_bp, url_prefix='/api/timeline')
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+    app.register_blueprint(timeline_bp, url_prefix='/api/timeline')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
-    # Auto-initialize database on startup (for serverless/free tier deployments)
-    with app.app_context():
-        # Step 1: Create tables
-        try:
-            db.create_all()
-            print("✅ Database tables created/verified")
-        except Exception as e:
-            print(f"⚠️ Table creation note: {e}")
-        
-        # Step 2: Create/update default users and sync passwords from environment variables
-        try:
-            founder_password = os.environ.get('FOUNDER_PASSWORD')
-            manager_password = os.environ.get('MANAGER_PASSWORD')
+    # No database work here: every worker (and every cold start) runs this.
+    # Tables, users, warehouses and schema patches come from `flask bootstrap`.
 
-            if founder_password:
-                abby = User.query.filter_by(username='abby').first()
-                if not abby:
-                    abby = User(
-                        username='abby',
-                        full_name='Abby',
-                        can_view_financials=True
-                    )
-                    db.session.add(abby)
-                    print("✅ Abby user created")
-                abby.set_password(founder_password)
-                db.session.commit()
-                print("✅ Abby password synchronized")
-            else:
-                print("⚠️ FOUNDER_PASSWORD environment variable not set. Skipping Abby password sync/creation.")
-
-            if manager_password:
-                ivy = User.query.filter_by(username='ivy').first()
-                if not ivy:
-                    ivy = User(
-                        username='ivy',
-                        full_name='Ivy',
-                        can_view_financials=False
-                    )
-                    db.session.add(ivy)
-                    print("✅ Ivy user created")
-                ivy.set_password(manager_password)
-                db.session.commit()
-                print("✅ Ivy password synchronized")
-            else:
-                print("⚠️ MANAGER_PASSWORD environment variable not set. Skipping Ivy password sync/creation.")
-
-            # Ensure Demo user is created
-            demo = User.query.filter_by(username='demo').first()
-            if not demo:
-                demo = User(
-                    username='demo',
-                    full_name='Demo User',
-                    can_view_financials=True
-                )
-                demo.set_password('demo')
-                db.session.add(demo)
-                db.session.commit()
-                print("✅ Demo user created")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ User creation/sync note: {e}")
-        
-        # Step 3: Create default warehouses (if they don't exist)
-        try:
-            if not Warehouse.query.filter_by(code='BHAIJAAN').first():
-                bhaijaan = Warehouse(
-                    code='BHAIJAAN',
-                    name='BhaiJaan',
-                    description='Main storage warehouse',
-                    is_default_intake=True,
-                    is_shipping_location=False
-                )
-                db.session.add(bhaijaan)
-                db.session.commit()
-                print("✅ BhaiJaan warehouse created")
-            
-            if not Warehouse.query.filter_by(code='MAHAPOLI').first():
-                mahapoli = Warehouse(
-                    code='MAHAPOLI',
-                    name='Mahapoli',
-                    description='Shipping/dispatch location',
-                    is_default_intake=False,
-                    is_shipping_location=True
-                )
-                db.session.add(mahapoli)
-                db.session.commit()
-                print("✅ Mahapoli warehouse created")
-            
-            print("✅ Database initialization complete")
-        except Exception as e:
-            db.session.rollback()
-            print(f"⚠️ Warehouse creation note: {e}")
-
-        # Step 4: Emergency Schema Fix (Auto-run)
-        try:
-            print("🔄 Checking for missing schema columns...")
-            from sqlalchemy import text
-            # Try to select warehouse_id from stock_intake
-            try:
-                db.session.execute(text("SELECT warehouse_id FROM stock_intake LIMIT 1"))
-            except Exception:
-                db.session.rollback()
-                print("⚠️ Column warehouse_id missing in stock_intake. Adding it...")
-                db.session.execute(text("ALTER TABLE stock_intake ADD COLUMN warehouse_id INTEGER REFERENCES warehouse(id)"))
-                db.session.commit()
-                print("✅ Added warehouse_id column")
-        except Exception as e:
-            print(f"⚠️ Schema check warning: {e}")
-            db.session.rollback()
+    @app.cli.command("bootstrap")
+    def bootstrap_command():
+        """Creates/patches the schema, default users and warehouses, and backfills derived data (idempotent)."""
+        failures = bootstrap_database(echo=click.echo)
+        if failures:
+            raise click.ClickException(f"{failures} bootstrap step(s) failed")
 
     @app.cli.command("create-users")
     def create_users():
-        """Creates Abby, Ivy and Demo users from environment variables."""
-        founder_password = os.environ.get('FOUNDER_PASSWORD')
-        manager_password = os.environ.get('MANAGER_PASSWORD')
-
-        if founder_password:
-            abby = User.query.filter_by(username='abby').first()
-            if not abby:
-                abby = User(username='abby', full_name='Abby', can_view_financials=True)
-                db.session.add(abby)
-                click.echo("Creating Abby user...")
-            abby.set_password(founder_password)
-            click.echo("✓ Abby user password synchronized.")
-        else:
-            click.echo("⚠️ FOUNDER_PASSWORD environment variable not set. Skipping Abby.")
-
-        if manager_password:
-            ivy = User.query.filter_by(username='ivy').first()
-            if not ivy:
-                ivy = User(username='ivy', full_name='Ivy', can_view_financials=False)
-                db.session.add(ivy)
-                click.echo("Creating Ivy user...")
-            ivy.set_password(manager_password)
-            click.echo("✓ Ivy user password synchronized.")
-        else:
-            click.echo("⚠️ MANAGER_PASSWORD environment variable not set. Skipping Ivy.")
-
-        # Always ensure Demo user exists
-        demo = User.query.filter_by(username='demo').first()
-        if not demo:
-            demo = User(username='demo', full_name='Demo User', can_view_financials=True)
-            db.session.add(demo)
-            click.echo("Creating Demo user...")
-        demo.set_password('demo')
-        click.echo("✓ Demo user password synchronized (password: demo).")
-
-        db.session.commit()
+        """Creates Abby, Ivy and Demo users from environment variables and resets their passwords."""
+        sync_default_users(echo=click.echo, force=True)
         click.echo("\n" + "="*50)
         click.echo("✅ User setup complete!")
         click.echo("="*50)
 
+    @app.cli.command("rebuild-expense-rollup")
+    def rebuild_expense_rollup_command():
+        """Recomputes monthly per-category expense totals from the expense table."""
+        rows = rebuild_expense_rollup()
+        click.echo(f"✅ Expense rollup rebuilt ({rows} rows).")
+
+    @app.cli.command("link-customer-sales")
+    def link_customer_sales_command():
+        """Links sales without a customer to the customer with the same phone number."""
+        linked, ambiguous, unmatched = link_sales_to_customers()
+        click.echo(f"✅ Linked {linked} sales ({ambiguous} ambiguous, {unmatched} unmatched).")
+
+    @app.cli.command("build-demo-db")
+    @click.option('--scale', default=None, type=int, help='Multiplier for the amount of generated data.')
+    @click.option('--seed', default=42, type=int, help='Random seed; the same seed gives the same data.')
+    def build_demo_db_command(scale, seed):
+        """(Re)builds the read-only SQLite database served to the demo user."""
+        from routes.demo_data import build_demo_database
+        path = app.config['DEMO_DATABASE_PATH']
+        counts = build_demo_database(path, scale=scale or app.config['DEMO_DATA_SCALE'], seed=seed)
+        click.echo(f"✅ Demo database written to {path}")
+        for table, count in counts.items():
+            click.echo(f"   {table}: {count}")
+        click.echo("Restart the workers to pick up the new file.")
+
+    @app.cli.command("seed-synthetic")
+    @click.option('--scale', default=1, type=int, help='Multiplier: 1 = 150 products, 60 customers, ~850 sales a year.')
+    @click.option('--years', default=1, type=int, help='Years of history to simulate, ending today.')
+    @click.option('--seed', default=42, type=int, help='Random seed; the same seed gives the same data.')
+    @click.option('--batch-size', default=50000, type=int, help='Rows generated and loaded per batch.')
+    def seed_synthetic_command(scale, years, seed, batch_size):
+        """Fills an empty database with a reproducible synthetic history for load testing."""
+        from synthetic_data import seed_database
+        import time
+
+        started = time.perf_counter()
+        try:
+            counts, username = seed_database(scale=scale, years=years, seed=seed, batch_size=batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        elapsed = time.perf_counter() - started
+
+        for table, count in counts.items():
+            click.echo(f"   {table}: {count}")
+        total = sum(counts.values())
+        click.echo(f"✅ Loaded {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s), attributed to {username}.")
+
     @app.route('/')
     def index():
         return jsonify({"message": "Welcome to the Workshop Inventory API"})
@@ -241,35 +173,33 @@ def create_app():
         if path in ['/api/auth/login', '/api/auth/register']:
             return
 
-        # Verify JWT optional
-        try:
-            # If no Authorization header is present (such as in OPTIONS preflight or public endpoints), skip
-            if not request.headers.get('Authorization'):
-                return
-            verify_jwt_in_request(optional=True)
-        except Exception:
-            # Let default Flask JWT route decorator handle invalid/expired tokens
+        # Verify the token once; route decorators reuse the result from g
+        # No Authorization header (OPTIONS preflight, public endpoints): nothing to check
+        if not request.headers.get('Authorization'):
+            return
+        verify_request_jwt()
+        if g.jwt_error is not None:
+            # Let the route decorator report invalid/expired tokens
             return
 
-        identity = get_jwt_identity()
+        identity = g.jwt_identity
         if identity == 'demo':
             # Block write actions
             if request.method not in ['GET', 'OPTIONS']:
                 return jsonify({"msg": "Action not allowed in Demo mode. Log in as an administrator to make changes."}), 403
 
-            # Intercept read actions
-            from routes.demo_data import get_mock_response
-            response_data = get_mock_response(path, request.args)
-            if response_data is not None:
-                # get_mock_response might return a tuple (data, status)
-                if isinstance(response_data, tuple):
-                    return jsonify(response_data[0]), response_data[1]
-                return jsonify(response_data)
+            # Serve reads from the read-only demo database through the normal routes
+            from routes.demo_data import get_demo_engine
+            g.demo_engine = get_demo_engine()
 
     return app
 
 app = create_app()
 
 if __name__ == '__main__':
+    # Local development: bootstrap the (usually SQLite) database before serving
+    with app.app_context():
+        bootstrap_database()
+    start_warmup(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
 
@@ -0,0 +1,175 @@
+"""
+Cold-start benchmark: import budget and time to first byte
+The service scales to zero off-hours, so the first request of the day waits
+for a whole process start. This script measures that path in fresh
+processes:
+- import: `import app` alone (median of --runs). It must stay under
+  --import-budget-ms, open no database connection and start no threads
+  (gunicorn preload_app forks after the import; threads and connections
+  would not survive it)
+- cold start: spawn a server process, wait for it to listen and send the
+  first request at once. Reported as boot (spawn -> listening), TTFB
+  (spawn -> first response byte), the first request itself and a warm
+  repeat, with and without WARMUP_ON_START
+
+Exits with status 1 if the import check fails.
+
+Usage (from backend/):
+    python benchmarks/cold_start.py
+    python benchmarks/cold_start.py --runs 10 --import-budget-ms 800
+    python benchmarks/cold_start.py --database-url postgresql://.../scratch
+
+A --database-url database is bootstrapped and gets a benchmark password for
+Abby; point it at a scratch database only.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PASSWORD = 'cold-start-benchmark'
+READY_MARKER = 'COLD_START_READY '
+
+# Imports the app the way a gunicorn worker does and reports what the import did
+IMPORT_SCRIPT = """
+import json, sys, threading, time
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+connections = []
+event.listen(Pool, 'connect', lambda *args: connections.append(1))
+started = time.perf_counter()
+import app
+print(json.dumps({
+    'import_ms': (time.perf_counter() - started) * 1000,
+    'connections': len(connections),
+    'threads': [t.name for t in threading.enumerate() if t is not threading.main_thread()],
+}))
+"""
+
+SERVER_SCRIPT = """
+import json, time
+from werkzeug.serving import make_server
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+from startup import prepare_worker
+prepare_worker(app)
+server = make_server('127.0.0.1', 0, app, threaded=True)
+print(%r + json.dumps({'port': server.port, 'import_ms': (imported - started) * 1000}), flush=True)
+server.serve_forever()
+""" % READY_MARKER
+
+BOOTSTRAP_SCRIPT = """
+from app import app
+from bootstrap import bootstrap_database
+with app.app_context():
+    bootstrap_database(echo=lambda message: None)
+response = app.test_client().post('/api/auth/login', json={'username': 'abby', 'password': %r})
+print(response.get_json()['access_token'])
+""" % PASSWORD
+
+def run_python(script, env):
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+def measure_import(env, runs):
+    samples = [json.loads(run_python(IMPORT_SCRIPT, env)) for _ in range(runs)]
+    return {
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'connections': max(s['connections'] for s in samples),
+        'threads': sorted({name for s in samples for name in s['threads']}),
+    }
+
+def timed_get(port, path, token):
+    """(time of the first response byte, ms from sending to it); the body is read and discarded"""
+    started = time.perf_counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    connection.request('GET', path, headers={'Authorization': f'Bearer {token}'})
+    response = connection.getresponse()
+    first_byte = time.perf_counter()
+    response.read()
+    connection.close()
+    if response.status != 200:
+        raise RuntimeError(f'GET {path} returned {response.status}')
+    return first_byte, (first_byte - started) * 1000
+
+def cold_start(env, path, token):
+    """One process start; returns its timings in milliseconds"""
+    spawned = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        for line in process.stdout:
+            if line.startswith(READY_MARKER):
+                ready = json.loads(line[len(READY_MARKER):])
+                break
+        else:
+            raise RuntimeError('server exited before listening')
+        listening = time.perf_counter()
+        first_byte, first_ms = timed_get(ready['port'], path, token)
+        _, warm_ms = timed_get(ready['port'], path, token)
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        'import_ms': ready['import_ms'],
+        'boot_ms': (listening - spawned) * 1000,
+        'ttfb_ms': (first_byte - spawned) * 1000,
+        'first_request_ms': first_ms,
+        'warm_request_ms': warm_ms,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5, help='Process starts per variant (medians are reported)')
+    parser.add_argument('--path', default='/api/products?limit=50', help='Authenticated GET sent as the first request')
+    parser.add_argument('--database-url', help='Scratch database; default: a temporary SQLite file')
+    parser.add_argument('--import-budget-ms', type=float, default=1000, help='Maximum median time for `import app`')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    env = dict(os.environ, FOUNDER_PASSWORD=PASSWORD, WARMUP_ON_START='0')
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    env['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='cold-start-'), 'app.db')
+    token = run_python(BOOTSTRAP_SCRIPT, env)
+
+    results = {'import': measure_import(env, args.runs), 'cold_start': {}}
+    for variant, warmup in (('no_warmup', '0'), ('warmup', '1')):
+        runs = [cold_start(dict(env, WARMUP_ON_START=warmup), args.path, token) for _ in range(args.runs)]
+        results['cold_start'][variant] = {
+            metric: round(statistics.median(run[metric] for run in runs), 1) for metric in runs[0]
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        imported = results['import']
+        print(f"import app: {imported['import_ms']:.0f} ms (budget {args.import_budget_ms:.0f} ms), "
+              f"{imported['connections']} connections, {len(imported['threads'])} threads")
+        for variant, metrics in results['cold_start'].items():
+            print(f"  {variant:10} boot {metrics['boot_ms']:7.1f} ms  TTFB {metrics['ttfb_ms']:7.1f} ms  "
+                  f"first {metrics['first_request_ms']:6.1f} ms  warm {metrics['warm_request_ms']:6.1f} ms")
+
+    failures = []
+    if results['import']['import_ms'] > args.import_budget_ms:
+        failures.append(f"import took {results['import']['import_ms']:.0f} ms, over the {args.import_budget_ms:.0f} ms budget")
+    if results['import']['connections']:
+        failures.append(f"import opened {results['import']['connections']} database connection(s)")
+    if results['import']['threads']:
+        failures.append(f"import started threads: {', '.join(results['import']['threads'])}")
+    if failures:
+        print(f"\n{len(failures)} cold-start check(s) failed:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
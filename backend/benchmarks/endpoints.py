@@ -0,0 +1,282 @@
+"""
+Endpoint benchmarks against a seeded database
+Boots create_app() on a fresh database per scale factor, loads it with
+`seed_database()` (the same data as `flask seed-synthetic`), then measures
+the hot endpoints through the test client: latency percentiles, SQL
+statements per request and response size.
+
+Results are compared with benchmarks/baseline.json. Any endpoint whose p50
+or queries per request grows by more than --threshold (default 20%) is
+reported (latency changes under --min-delta-ms are ignored as jitter), and
+the script exits with status 1. p95/p99 are recorded but not gated: with a
+few dozen samples they mostly measure noise.
+
+Usage (from backend/):
+    python benchmarks/endpoints.py                          # scales 1 and 10, temporary SQLite files
+    python benchmarks/endpoints.py --scales 1,10,50 --requests 100
+    python benchmarks/endpoints.py --database-url postgresql://localhost/bench
+    python benchmarks/endpoints.py --save                   # record results as the new baseline
+
+A --database-url database is dropped and recreated for every scale; point it
+at a scratch database only.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND_DIR)
+
+# Metrics compared with the baseline; tail latencies are too noisy at these sample sizes
+GATED_METRICS = ('p50_ms', 'queries')
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+PASSWORD = os.environ.setdefault('FOUNDER_PASSWORD', 'benchmark')
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+# Server-Timing entry written by the request instrumentation: db;dur=1.23;desc="7 queries"
+DB_TIMING_PATTERN = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+class Bench:
+    """
+    Test client wrapper that times requests and counts their SQL statements
+    Statements are counted by the per-request instrumentation (the app must be
+    created with SQL_INSTRUMENTATION on) and read back from Server-Timing.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        response = self.client.post('/api/auth/login', json={'username': 'abby', 'password': PASSWORD})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        self.headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def request(self, method, path, body=None, auth=True):
+        """(seconds, statements, bytes, response) for one request"""
+        start = time.perf_counter()
+        response = self.client.open(path, method=method, json=body, headers=self.headers if auth else None)
+        elapsed = time.perf_counter() - start
+        assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.get_data(as_text=True)[:200]}"
+        match = DB_TIMING_PATTERN.search(response.headers.get('Server-Timing', ''))
+        assert match, f"{method} {path}: no Server-Timing db entry (is SQL_INSTRUMENTATION on?)"
+        return elapsed, int(match.group(1)), len(response.get_data()), response
+
+def restock(bench, product_ids, warehouse_id, quantity):
+    """Unmeasured intake giving every benchmarked product enough stock for all sales and transfers"""
+    bench.request('POST', '/api/stock-intake', {
+        'supplier_name': 'Benchmark Restock',
+        'warehouse_id': warehouse_id,
+        'items': [{'product_id': pid, 'quantity': quantity, 'purchase_price_per_unit': 100.0} for pid in product_ids]
+    })
+
+def build_scenarios(app):
+    """
+    (name, method, request factory, auth) for each hot endpoint, plus the
+    product ids they sell or move; factories return (path, body)
+    """
+    from models import Product, Warehouse
+
+    with app.app_context():
+        product_ids = [p.id for p in Product.query.filter_by(is_active=True).order_by(Product.id).limit(20)]
+        intake_wh = Warehouse.query.filter_by(code='BHAIJAAN').first().id
+        shipping_wh = Warehouse.query.filter_by(code='MAHAPOLI').first().id
+    month = date.today().strftime('%Y-%m')
+    created_sales = []
+    counter = iter(range(10 ** 9))
+
+    def pick(n=1):
+        i = next(counter)
+        return [product_ids[(i + k) % len(product_ids)] for k in range(n)]
+
+    def intake_create():
+        return '/api/stock-intake', {
+            'supplier_name': 'Benchmark Supplier',
+            'items': [{'product_id': pid, 'quantity': 100, 'purchase_price_per_unit': 100.0} for pid in pick(3)]
+        }
+
+    def sale_create():
+        return '/api/sales', {
+            'customer_name': 'Benchmark Customer',
+            'payment_method': 'cash',
+            'items': [{'product_id': pid, 'quantity': 1, 'unit_price': 500.0} for pid in pick(2)]
+        }
+
+    def sale_update():
+        sale_id = created_sales[next(counter) % len(created_sales)]
+        return f'/api/sales/{sale_id}', {'notes': 'benchmark', 'discount_amount': 0}
+
+    def transfer_create():
+        return '/api/warehouses/transfers', {
+            'product_id': pick()[0], 'from_warehouse_id': intake_wh,
+            'to_warehouse_id': shipping_wh, 'quantity': 1
+        }
+
+    def fixed(path):
+        return lambda: (path, None)
+
+    scenarios = [
+        ('intake_create', 'POST', intake_create, True),
+        ('intake_list', 'GET', fixed('/api/stock-intake'), True),
+        ('sale_create', 'POST', sale_create, True),
+        ('sale_update', 'PUT', sale_update, True),
+        ('sales_list', 'GET', fixed('/api/sales'), True),
+        ('transfer_create', 'POST', transfer_create, True),
+        ('transfers_list', 'GET', fixed('/api/warehouses/transfers'), True),
+        ('products_list', 'GET', fixed('/api/products'), True),
+        ('products_search', 'GET', fixed('/api/products?search=Honda'), True),
+        ('expenses_summary', 'GET', fixed(f'/api/expenses/summary?month={month}'), True),
+        ('catalog_variants', 'GET', fixed('/api/catalog/variants'), False),
+    ]
+    return scenarios, created_sales, product_ids, intake_wh
+
+def run_scale(scale, database_url, requests, warmup):
+    """Seed a fresh database at scale and benchmark every scenario; returns {endpoint: metrics}"""
+    from sqlalchemy import create_engine
+    from config import Config
+    from models import db
+    from bootstrap import bootstrap_database
+    from synthetic_data import seed_database
+    from routes.catalog import invalidate_catalog_cache
+    from routes.products import invalidate_fit_index
+    from routes.reports import clear_report_cache
+    from routes.utils import clear_user_cache
+
+    if database_url.startswith('postgresql'):
+        engine = create_engine(database_url)
+        db.metadata.drop_all(engine)
+        engine.dispose()
+    Config.SQLALCHEMY_DATABASE_URI = database_url
+    Config.SQL_INSTRUMENTATION = True
+    from app import create_app
+    app = create_app()
+    # Statements are read from Server-Timing; the per-request log lines are just noise here
+    logging.getLogger('instrumentation').setLevel(logging.ERROR)
+
+    # Per-worker caches are module level and would leak between databases
+    for clear in (invalidate_catalog_cache, invalidate_fit_index, clear_report_cache, clear_user_cache):
+        clear()
+
+    with app.app_context():
+        bootstrap_database(echo=lambda message: None)
+        started = time.perf_counter()
+        counts, _ = seed_database(scale=scale)
+        print(f"  seeded {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s "
+              f"({counts['product']:,} products, {counts['sale']:,} sales)", file=sys.stderr)
+
+    bench = Bench(app)
+    scenarios, created_sales, product_ids, intake_wh = build_scenarios(app)
+    # Each request sells or moves at most 2 units of a product
+    restock(bench, product_ids, intake_wh, 2 * len(scenarios) * (requests + warmup))
+    results = {}
+    for name, method, factory, auth in scenarios:
+        for _ in range(warmup):
+            bench.request(method, *factory(), auth=auth)
+        timings, statements, sizes = [], [], []
+        for _ in range(requests):
+            elapsed, count, size, response = bench.request(method, *factory(), auth=auth)
+            timings.append(elapsed * 1000)
+            statements.append(count)
+            sizes.append(size)
+            if name == 'sale_create':
+                created_sales.append(response.get_json()['data']['id'])
+        results[name] = {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': round(statistics.mean(statements), 2),
+            'bytes': round(statistics.mean(sizes)),
+        }
+        print(f"  {name:18} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+              f"{results[name]['queries']:6.1f} queries  {results[name]['bytes']:>9,} bytes", file=sys.stderr)
+
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    return results
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Regressions as readable lines: a metric grew by more than threshold over
+    the baseline (latencies also by at least min_delta_ms, to ignore jitter)
+    """
+    regressions = []
+    for scale, endpoints in results.items():
+        for name, metrics in endpoints.items():
+            previous = baseline.get(scale, {}).get(name)
+            if not previous:
+                continue
+            for metric in GATED_METRICS:
+                old, new = previous.get(metric), metrics[metric]
+                if metric.endswith('_ms') and new - (old or 0) < min_delta_ms:
+                    continue
+                if old and new > old * (1 + threshold):
+                    regressions.append(f"scale {scale} {name}: {metric} {old} -> {new} (+{(new - old) / old:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scales', default='1,10', help='Comma-separated scale factors (default: 1,10)')
+    parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint')
+    parser.add_argument('--database-url', help='Scratch database (dropped per scale); default: temporary SQLite files')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Allowed growth before flagging (0.2 = 20%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='Ignore latency growth smaller than this')
+    parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    tmpdir = tempfile.mkdtemp(prefix='bench-')
+    urls = {
+        scale: args.database_url or f"sqlite:///{os.path.join(tmpdir, f'scale-{scale}.db')}"
+        for scale in scales
+    }
+    # app.py builds a module-level app on import; keep it off the real database
+    os.environ['DATABASE_URL'] = urls[scales[0]]
+
+    results = {}
+    for scale in scales:
+        print(f"scale {scale}:", file=sys.stderr)
+        results[str(scale)] = run_scale(scale, urls[scale], args.requests, args.warmup)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get('results', {})
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'recorded_at': date.today().isoformat(),
+                'python': platform.python_version(),
+                'database': 'postgresql' if args.database_url and args.database_url.startswith('postgresql') else 'sqlite',
+                'requests': args.requests,
+                'results': {**baseline, **results}
+            }, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    if baseline:
+        print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
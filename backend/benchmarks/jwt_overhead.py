@@ -0,0 +1,87 @@
+"""
+Micro-benchmark: JWT verification overhead per request
+Compares the old flow (the demo interceptor, jwt_required and
+require_financial_access each verifying the token) with the single
+verification shared through g. No database is needed.
+
+Usage (from backend/):
+    python benchmarks/jwt_overhead.py [requests]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask, jsonify, g
+from flask_jwt_extended import JWTManager, create_access_token, get_jwt, verify_jwt_in_request
+from flask_jwt_extended import jwt_required as library_jwt_required
+from routes.utils import jwt_required, require_financial_access, verify_request_jwt
+
+def build_app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'benchmark-secret-key-of-reasonable-length'
+    JWTManager(app)
+
+    @app.before_request
+    def demo_check():
+        # Old interceptor verified here, new one stores the result on g
+        if g.get('shared'):
+            verify_request_jwt()
+        else:
+            verify_jwt_in_request(optional=True)
+
+    def old_financial_access(fn):
+        @library_jwt_required()
+        def wrapper(*args, **kwargs):
+            if not get_jwt().get('can_view_financials', False):
+                return jsonify({"msg": "Financial data access denied"}), 403
+            return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        return wrapper
+
+    @app.route('/old')
+    @library_jwt_required()
+    @old_financial_access
+    def old_route():
+        return jsonify({'ok': True})
+
+    @app.route('/new')
+    @jwt_required()
+    @require_financial_access
+    def new_route():
+        return jsonify({'ok': True})
+
+    @app.url_value_preprocessor
+    def mark_shared(endpoint, values):
+        g.shared = endpoint == 'new_route'
+
+    return app
+
+def time_requests(client, path, headers, n):
+    for _ in range(min(n, 200)):
+        client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(n):
+        response = client.get(path, headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return elapsed / n * 1e6
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    app = build_app()
+    with app.app_context():
+        token = create_access_token(identity='abby', additional_claims={'can_view_financials': True, 'user_id': 1})
+    headers = {'Authorization': f'Bearer {token}'}
+    client = app.test_client()
+
+    old = time_requests(client, '/old', headers, n)
+    new = time_requests(client, '/new', headers, n)
+    print(f"{n} requests each")
+    print(f"  verify per layer (old): {old:8.1f} us/request")
+    print(f"  verify once (new):      {new:8.1f} us/request")
+    print(f"  saved:                  {old - new:8.1f} us/request ({(old - new) / old:.0%})")
+
+if __name__ == '__main__':
+    main()
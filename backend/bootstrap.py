@@ -0,0 +1,182 @@
+"""
+Database bootstrap, run with `flask bootstrap` once per deploy (Render's
+pre-deploy command), never on the server's start path
+Creates the tables, default users and warehouses, patches columns and
+indexes added after the first production deploy, and backfills derived
+data. Every step is idempotent, so it is safe to run on each deploy;
+create_app() itself no longer touches the database. check_schema() is the
+cheap per-worker guard that refuses to serve from a database that was
+never bootstrapped.
+"""
+from sqlalchemy import inspect, text
+from models import db, User, Warehouse, Expense, ExpenseMonthlyRollup, rebuild_expense_rollup
+import os
+
+# (username, full name, can view financials, environment variable with the password)
+DEFAULT_USERS = [
+    ('abby', 'Abby', True, 'FOUNDER_PASSWORD'),
+    ('ivy', 'Ivy', False, 'MANAGER_PASSWORD'),
+]
+DEMO_PASSWORD = 'demo'
+
+# (code, name, description, default intake, shipping location)
+DEFAULT_WAREHOUSES = [
+    ('BHAIJAAN', 'BhaiJaan', 'Main storage warehouse', True, False),
+    ('MAHAPOLI', 'Mahapoli', 'Shipping/dispatch location', False, True),
+]
+
+# Columns added after the first production deploy: (table, column, DDL type)
+SCHEMA_COLUMNS = [
+    ('stock_intake', 'warehouse_id', 'INTEGER REFERENCES warehouse(id)'),
+    ('stock_transfer', 'batch_id', 'VARCHAR(32)'),
+    ('customer', 'phone_normalized', 'VARCHAR(10)'),
+    ('customer', 'phone_reversed', 'VARCHAR(10)'),
+    ('product', 'year_from', 'INTEGER'),
+    ('product', 'year_to', 'INTEGER'),
+]
+# Indexes added after the first production deploy (idempotent)
+SCHEMA_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_stock_transfer_batch_id ON stock_transfer (batch_id)',
+    'CREATE INDEX IF NOT EXISTS ix_stock_transfer_date_id ON stock_transfer (transfer_date, id)',
+    'CREATE INDEX IF NOT EXISTS ix_stock_transfer_product_date ON stock_transfer (product_id, transfer_date)',
+    'CREATE INDEX IF NOT EXISTS ix_stock_transfer_from_date ON stock_transfer (from_warehouse_id, transfer_date)',
+    'CREATE INDEX IF NOT EXISTS ix_stock_transfer_to_date ON stock_transfer (to_warehouse_id, transfer_date)',
+    'CREATE INDEX IF NOT EXISTS ix_expense_date ON expense (date)',
+    'CREATE INDEX IF NOT EXISTS ix_expense_category_date ON expense (category, date)',
+    'CREATE INDEX IF NOT EXISTS ix_sale_customer_id ON sale (customer_id)',
+    'CREATE INDEX IF NOT EXISTS ix_customer_phone_normalized ON customer (phone_normalized)',
+    'CREATE INDEX IF NOT EXISTS ix_product_year_range ON product (year_from, year_to)',
+    'CREATE INDEX IF NOT EXISTS ix_timeline_event_type_id ON timeline_event (event_type, id)',
+    'CREATE INDEX IF NOT EXISTS ix_timeline_event_user_id ON timeline_event (user_id, id)',
+    'CREATE INDEX IF NOT EXISTS ix_timeline_event_timestamp ON timeline_event (timestamp)',
+]
+# Indexes whose DDL differs per dialect (operator classes), created from the model: (table, index name)
+SCHEMA_MODEL_INDEXES = [
+    ('customer', 'ix_customer_phone_reversed'),
+]
+
+def _sync_user(username, full_name, can_view_financials, password, echo, force):
+    """Create the user if missing; an existing password is only rewritten with force"""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        user = User(username=username, full_name=full_name, can_view_financials=can_view_financials)
+        db.session.add(user)
+        echo(f"✅ {username.capitalize()} user created")
+    elif not force and user.password_hash:
+        return False
+    user.set_password(password)
+    echo(f"✅ {username.capitalize()} password synchronized")
+    return True
+
+def sync_default_users(echo=print, force=False):
+    """
+    Abby and Ivy from FOUNDER_PASSWORD / MANAGER_PASSWORD, plus the demo user
+    Existing passwords are left alone unless force=True (`flask create-users`),
+    so repeated runs neither write nor spend time on the slow password hash.
+    """
+    for username, full_name, can_view_financials, variable in DEFAULT_USERS:
+        password = os.environ.get(variable)
+        if password:
+            _sync_user(username, full_name, can_view_financials, password, echo, force)
+        else:
+            echo(f"⚠️ {variable} environment variable not set. Skipping {full_name} password sync/creation.")
+    _sync_user('demo', 'Demo User', True, DEMO_PASSWORD, echo, force)
+    db.session.commit()
+
+def ensure_warehouses(echo=print):
+    existing = {code for (code,) in db.session.query(Warehouse.code)}
+    for code, name, description, is_default_intake, is_shipping_location in DEFAULT_WAREHOUSES:
+        if code in existing:
+            continue
+        db.session.add(Warehouse(
+            code=code,
+            name=name,
+            description=description,
+            is_default_intake=is_default_intake,
+            is_shipping_location=is_shipping_location
+        ))
+        echo(f"✅ {name} warehouse created")
+    db.session.commit()
+
+def patch_schema(echo=print):
+    """Add columns and indexes that create_all() does not add to existing tables"""
+    echo("🔄 Checking for missing schema columns...")
+    for table, column, ddl in SCHEMA_COLUMNS:
+        try:
+            db.session.execute(text(f"SELECT {column} FROM {table} LIMIT 1"))
+        except Exception:
+            db.session.rollback()
+            echo(f"⚠️ Column {column} missing in {table}. Adding it...")
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            db.session.commit()
+            echo(f"✅ Added {column} column")
+    for statement in SCHEMA_INDEXES:
+        db.session.execute(text(statement))
+    for table, name in SCHEMA_MODEL_INDEXES:
+        index = next(i for i in db.metadata.tables[table].indexes if i.name == name)
+        index.create(bind=db.session.connection(), checkfirst=True)
+    db.session.commit()
+
+def backfill_derived_data(echo=print):
+    """Fill tables/columns that were added after data already existed"""
+    from routes.products import backfill_product_years
+    from routes.customers import backfill_customer_phones
+
+    if not ExpenseMonthlyRollup.query.first() and Expense.query.first():
+        rows = rebuild_expense_rollup()
+        echo(f"✅ Expense rollup backfilled ({rows} rows)")
+    phones = backfill_customer_phones()
+    if phones:
+        echo(f"✅ Normalized {phones} customer phone numbers")
+    years = backfill_product_years()
+    if years:
+        echo(f"✅ Parsed year ranges for {years} products")
+
+def bootstrap_database(echo=print):
+    """
+    Run every bootstrap step inside the current app context
+    A failing step is reported and rolled back; the remaining steps still
+    run. Returns the number of failed steps.
+    """
+    steps = [
+        ('Table creation', lambda: db.create_all()),
+        ('User sync', lambda: sync_default_users(echo)),
+        ('Warehouse creation', lambda: ensure_warehouses(echo)),
+        ('Schema check', lambda: patch_schema(echo)),
+        ('Backfill', lambda: backfill_derived_data(echo)),
+    ]
+    failures = 0
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            db.session.rollback()
+            echo(f"⚠️ {name} failed: {e}")
+            failures += 1
+    if not failures:
+        echo("✅ Database initialization complete")
+    return failures
+
+def schema_problems():
+    """Tables and patched columns missing from the database; empty when it is up to date"""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    problems = [table for table in db.metadata.tables if table not in tables]
+    columns = {}
+    for table, column, _ in SCHEMA_COLUMNS:
+        if table not in tables:
+            continue
+        if table not in columns:
+            columns[table] = {c['name'] for c in inspector.get_columns(table)}
+        if column not in columns[table]:
+            problems.append(f"{table}.{column}")
+    return problems
+
+def check_schema(app):
+    """Raise RuntimeError if the schema is behind the models, so a worker fails at boot, not on a query"""
+    with app.app_context():
+        problems = schema_problems()
+    if problems:
+        raise RuntimeError(
+            f"Database schema is behind the code (missing: {', '.join(problems)}). Run `flask bootstrap`."
+        )
@@ -25,4 +25,49 @@ class Config:
     }
     
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'super-secret-jwt-key'
+    
+    # Seconds a closed profit & loss period stays cached in each worker
+    PNL_CACHE_TTL = int(os.environ.get('PNL_CACHE_TTL', 900))
 
+    
+    # Seconds before a worker rebuilds its product fit index even without local writes
+    FIT_INDEX_TTL = int(os.environ.get('FIT_INDEX_TTL', 300))
+    
+    # Seconds the public catalog variants are served from cache (also the Cache-Control max-age)
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 60))
+    
+    # Seconds a looked-up user stays cached in each worker (dropped early on password/permission changes)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    
+    # Read-only SQLite database that serves demo users (built on first use or with `flask build-demo-db`)
+    DEMO_DATABASE_PATH = os.environ.get('DEMO_DATABASE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'demo.db')
+    DEMO_DATA_SCALE = int(os.environ.get('DEMO_DATA_SCALE', 1))
+    
+    # Per-request SQL counts/timings in Server-Timing headers and logs (off by default)
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    # Identical statements per request at which a suspected N+1 is logged
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+    
+    # Bearer token required to scrape /metrics (the endpoint returns 404 when unset)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Statements slower than this many ms are logged with their route (0, the default, disables)
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 0))
+    # Share of slow PostgreSQL SELECTs EXPLAINed in the background (plans are logged redacted)
+    SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0.1))
+    # EXPLAIN (ANALYZE, BUFFERS) instead of a plain EXPLAIN; re-executes the sampled SELECTs
+    SLOW_QUERY_EXPLAIN_ANALYZE = os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE', '').lower() in ('1', 'true', 'yes')
+    # Rotating log file per worker (<name>.<pid>.log) for slow queries and plans (default: stderr)
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+    
+    # Admin requests with `X-Profile: cprofile|sample` are profiled and stored in PROFILE_DIR
+    REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '1').lower() in ('1', 'true', 'yes')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')  # Default: instance/profiles
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+    
+    # Refuse to start a worker when the database is missing tables/columns (run `flask bootstrap`)
+    SCHEMA_CHECK_ON_START = os.environ.get('SCHEMA_CHECK_ON_START', '1').lower() in ('1', 'true', 'yes')
+    # Open database connections in the background right after a worker boots
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '0').lower() in ('1', 'true', 'yes')
+    WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', 1))
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings (picked up automatically from the working directory)
+Prepares a shared directory for the Prometheus client's multi-process mode
+before any worker imports the app, and drops a worker's live gauges when it
+exits.
+The app is preloaded in the master and forked into the workers: importing
+it does no database work and starts no threads (benchmarks/cold_start.py
+checks this), and prepare_worker() does the per-worker setup after the fork.
+"""
+import os
+import shutil
+import tempfile
+
+# Must be set before prometheus_client is imported by the app
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'glasshouse-metrics')
+)
+# Samples from a previous run would otherwise be added to this one
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+# Import the app once instead of once per worker
+preload_app = True
+
+def post_worker_init(worker):
+    from startup import prepare_worker
+    prepare_worker(worker.wsgi)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
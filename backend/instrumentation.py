@@ -0,0 +1,132 @@
+"""
+Opt-in per-request instrumentation (SQL_INSTRUMENTATION=1)
+Counts SQL statements, database time and JSON serialization time for each
+request, reports them in a Server-Timing header and one structured log line,
+and warns when a statement shape repeats within a request (a likely N+1).
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('instrumentation')
+
+_listeners_installed = False
+
+# Expanded IN lists differ in length between otherwise identical statements
+IN_LIST_PATTERN = re.compile(r'\bIN\s*\((?:\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+def statement_shape(statement):
+    """Statement text with IN lists collapsed, so repeated lookups compare equal"""
+    return WHITESPACE_PATTERN.sub(' ', IN_LIST_PATTERN.sub('IN (...)', statement)).strip()
+
+class RequestStats:
+    """SQL and serialization timings collected during one request"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.shapes = Counter()
+
+    def repeated_shapes(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+def current_stats():
+    """RequestStats for the request being served, or None (instrumentation off, no request)"""
+    if not has_request_context():
+        return None
+    return g.get('request_stats')
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() provider that adds its serialization time to the request stats"""
+    def dumps(self, obj, **kwargs):
+        stats = current_stats()
+        if stats is None:
+            return super().dumps(obj, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats.serialize_time += time.perf_counter() - start
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.instrumentation_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats()
+    started = getattr(context, 'instrumentation_started', None)
+    if stats is None or started is None:
+        return
+    stats.statements += 1
+    stats.db_time += time.perf_counter() - started
+    stats.shapes[statement_shape(statement)] += 1
+
+def _install_listeners():
+    """Listen on every engine (main and demo), once per process"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _listeners_installed = True
+
+def init_instrumentation(app):
+    """Attach the request hooks to app if SQL_INSTRUMENTATION is enabled"""
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+    _install_listeners()
+    app.json = TimedJSONProvider(app)
+    threshold = app.config.get('N_PLUS_ONE_THRESHOLD', 5)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(levelname)s %(name)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    @app.before_request
+    def start_request_stats():
+        g.request_stats = RequestStats()
+
+    @app.after_request
+    def report_request_stats(response):
+        stats = g.pop('request_stats', None)
+        if stats is None:
+            return response
+        total = (time.perf_counter() - stats.started) * 1000
+        db_ms = stats.db_time * 1000
+        serialize_ms = stats.serialize_time * 1000
+        app_ms = max(total - db_ms - serialize_ms, 0.0)
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.2f};desc="{stats.statements} queries"',
+            f'serialize;dur={serialize_ms:.2f}',
+            f'app;dur={app_ms:.2f}',
+            f'total;dur={total:.2f}',
+        ])
+        response.headers['Timing-Allow-Origin'] = '*'
+
+        repeated = stats.repeated_shapes(threshold)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'statements': stats.statements,
+            'db_ms': round(db_ms, 2),
+            'serialize_ms': round(serialize_ms, 2),
+            'total_ms': round(total, 2),
+        }
+        if repeated:
+            record['n_plus_one'] = [{'count': count, 'statement': shape[:300]} for shape, count in repeated]
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
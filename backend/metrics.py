@@ -0,0 +1,128 @@
+"""
+Prometheus metrics, served at /metrics
+Under gunicorn each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+(set up by gunicorn.conf.py) and /metrics aggregates all of them, so any
+worker can answer a scrape. Without that variable the metrics are simply
+per-process, which is what `flask run` needs.
+Scraping requires METRICS_TOKEN as a bearer token; without it /metrics is a 404.
+"""
+import hmac
+import os
+import time
+from flask import Response, current_app, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models import db
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by route',
+    ['blueprint', 'route', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+REQUESTS = Counter('http_requests_total', 'Requests by route and status', ['blueprint', 'route', 'method', 'status'])
+IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being served', multiprocess_mode='livesum')
+DB_POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Connections checked out of the pool', multiprocess_mode='livesum')
+DB_POOL_OVERFLOW = Gauge('db_pool_overflow', 'Connections open beyond the pool size', multiprocess_mode='livesum')
+DB_QUERIES = Counter('db_queries_total', 'SQL statements executed')
+CACHE_LOOKUPS = Counter('cache_lookups_total', 'In-process cache lookups', ['cache', 'result'])
+BUSINESS_EVENTS = Counter('business_events_total', 'Committed domain events (sales, stock movements, ...)', ['event_type'])
+
+# Set by routes.timeline when its events are written; counted once the commit succeeds
+COMMITTED_EVENTS_KEY = 'metrics_events'
+
+_listeners_installed = False
+
+def record_cache_lookup(cache, hit, count=1):
+    """Count count lookups in cache as hits or misses"""
+    if count:
+        CACHE_LOOKUPS.labels(cache=cache, result='hit' if hit else 'miss').inc(count)
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES.inc()
+
+def _count_business_events(session):
+    for event_type in session.info.pop(COMMITTED_EVENTS_KEY, ()):
+        BUSINESS_EVENTS.labels(event_type=event_type).inc()
+
+def _discard_business_events(session):
+    session.info.pop(COMMITTED_EVENTS_KEY, None)
+
+def _install_listeners():
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Engine, 'after_cursor_execute', _count_query)
+    event.listen(Session, 'after_commit', _count_business_events)
+    event.listen(Session, 'after_rollback', _discard_business_events)
+    _listeners_installed = True
+
+def _watch_pool(engine):
+    """Track pool usage as connections are checked out and returned"""
+    pool = engine.pool
+
+    def update_overflow():
+        if hasattr(pool, 'overflow'):
+            DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+    @event.listens_for(pool, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+        update_overflow()
+
+    @event.listens_for(pool, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        # Fires just before the connection goes back, so overflow may drop by one afterwards
+        DB_POOL_CHECKED_OUT.dec()
+        update_overflow()
+
+def _route_labels():
+    rule = request.url_rule
+    return {
+        'blueprint': request.blueprint or 'app',
+        'route': rule.rule if rule else '<unmatched>',
+        'method': request.method,
+    }
+
+def init_metrics(app):
+    """Register the request hooks, database listeners and the /metrics endpoint"""
+    _install_listeners()
+    with app.app_context():
+        _watch_pool(db.engine)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.get('metrics_started')
+        if started is not None and request.endpoint != 'metrics':
+            labels = _route_labels()
+            REQUEST_LATENCY.labels(**labels).observe(time.perf_counter() - started)
+            REQUESTS.labels(status=str(response.status_code), **labels).inc()
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        if g.pop('metrics_started', None) is not None:
+            IN_FLIGHT.dec()
+
+    @app.route('/metrics')
+    def metrics():
+        token = current_app.config.get('METRICS_TOKEN')
+        if not token:
+            # Not configured: the endpoint does not exist (it would expose traffic and sales volumes)
+            return Response('Not Found\n', status=404, mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,44 @@
+"""Add customer phone_reversed for indexed suffix lookups
+
+Revision ID: 3e91a7c4b652
+Revises: 1b7e3c50d4a9
+Create Date: 2026-10-19 18:05:41.372915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e91a7c4b652'
+down_revision = '1b7e3c50d4a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_reversed', sa.String(length=10), nullable=True))
+        batch_op.create_index('ix_customer_phone_reversed', ['phone_reversed'], unique=False,
+                              postgresql_ops={'phone_reversed': 'text_pattern_ops'})
+
+    # Backfill from the normalized phone
+    bind = op.get_bind()
+    customer = sa.table('customer', sa.column('id', sa.Integer), sa.column('phone_normalized', sa.String),
+                        sa.column('phone_reversed', sa.String))
+    rows = bind.execute(
+        sa.select(customer.c.id, customer.c.phone_normalized).where(customer.c.phone_normalized.isnot(None))
+    ).all()
+    updates = [{'customer_id': row.id, 'reversed': row.phone_normalized[::-1]} for row in rows]
+    if updates:
+        bind.execute(
+            customer.update().where(customer.c.id == sa.bindparam('customer_id'))
+            .values(phone_reversed=sa.bindparam('reversed')),
+            updates
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.drop_index('ix_customer_phone_reversed')
+        batch_op.drop_column('phone_reversed')
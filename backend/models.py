@@ -1,9 +1,26 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from werkzeug.security import generate_password_hash, check_password_hash
 import enum
+import re
+from collections import defaultdict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, validates
 from sqlalchemy.sql import func
 
-db = SQLAlchemy()
+def is_demo_request():
+    """True while serving a demo user's request from the demo database"""
+    return has_app_context() and g.get('demo_engine') is not None
+
+class RoutingSession(FlaskSession):
+    """Session that sends demo requests to the read-only demo database"""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and is_demo_request():
+            return g.demo_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """User model for Abby and Ivy with financial access control"""
@@ -23,6 +40,32 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.full_name} ({self.username})>'
 
+YEAR_PATTERN = re.compile(r'\b((?:19|20)\d{2})(?:\s*[-\u2013/]\s*(\d{2})\b(?!\s*[-\u2013/]?\d))?')
+OPEN_ENDED_PATTERN = re.compile(r'\+|\b(?:onwards?|present|now)\b|[-\u2013]\s*$')
+
+def parse_year_range(year):
+    """
+    Parse free-text model years into (year_from, year_to).
+    '2020' -> (2020, 2020), '2018-2022' and '2018-22' -> (2018, 2022),
+    '2018+' or '2018-present' -> (2018, None). (None, None) if no year is found.
+    """
+    if not year:
+        return None, None
+    text = str(year).strip().lower()
+    years = []
+    for match in YEAR_PATTERN.finditer(text):
+        start = int(match.group(1))
+        years.append(start)
+        if match.group(2):
+            # Two-digit end year: '2018-22' -> 2022
+            end = start // 100 * 100 + int(match.group(2))
+            years.append(end if end >= start else end + 100)
+    if not years:
+        return None, None
+    if len(years) == 1 and OPEN_ENDED_PATTERN.search(text):
+        return years[0], None
+    return min(years), max(years)
+
 class ProductCategory(enum.Enum):
     """Categories for wholesale auto glass products"""
     SUNROOF = 'sunroof'
@@ -47,6 +90,8 @@ class Product(db.Model):
     width_mm = db.Column(db.String(20), nullable=True)
     thickness_mm = db.Column(db.String(20), nullable=True)
     year = db.Column(db.String(50), nullable=True)  # e.g., "2020" or "2018-2023"
+    year_from = db.Column(db.Integer, nullable=True)  # Parsed from year on write
+    year_to = db.Column(db.Integer, nullable=True)  # None for open-ended ranges ("2018+")
     
     # Inventory Management
     stock_quantity = db.Column(db.Integer, default=0, nullable=False)
@@ -86,14 +131,34 @@ class Product(db.Model):
             return ((self.selling_price - self.purchase_price) / self.purchase_price) * 100
         return None
     
+    __table_args__ = (db.Index('ix_product_year_range', 'year_from', 'year_to'),)
+    
+    @validates('year')
+    def _sync_year_range(self, key, year):
+        self.year_from, self.year_to = parse_year_range(year)
+        return year
+    
     def __repr__(self):
         return f'<Product {self.product_code}: {self.name}>'
 
+def normalize_phone(phone):
+    """
+    Reduce a free-text phone number to its last 10 digits, so '+91 98765 43210',
+    '098765-43210' and '9876543210' all compare equal. None if there are no digits.
+    """
+    if not phone:
+        return None
+    digits = re.sub(r'\D', '', phone)
+    return digits[-10:] or None
+
 class Customer(db.Model):
     """Customer model for managing client database"""
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     phone = db.Column(db.String(20), nullable=True)
+    phone_normalized = db.Column(db.String(10), nullable=True, index=True)  # Kept in sync with phone
+    # phone_normalized reversed: a trailing-digits lookup becomes an indexed prefix LIKE
+    phone_reversed = db.Column(db.String(10), nullable=True)
     company = db.Column(db.String(200), nullable=True)
     city = db.Column(db.String(100), nullable=True)
     address = db.Column(db.Text, nullable=True)
@@ -102,6 +167,17 @@ class Customer(db.Model):
     # Relationship
     sales = db.relationship('Sale', backref='customer', lazy=True)
 
+    __table_args__ = (
+        # text_pattern_ops: PostgreSQL only uses a B-tree for LIKE 'prefix%' with it (non-C collations)
+        db.Index('ix_customer_phone_reversed', 'phone_reversed', postgresql_ops={'phone_reversed': 'text_pattern_ops'}),
+    )
+
+    @validates('phone')
+    def _sync_phone_normalized(self, key, phone):
+        self.phone_normalized = normalize_phone(phone)
+        self.phone_reversed = self.phone_normalized[::-1] if self.phone_normalized else None
+        return phone
+
     def __repr__(self):
         return f'<Customer {self.name}>'
 
@@ -113,7 +189,7 @@ class Sale(db.Model):
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)  # INV-2024-001
     
     # Customer Info (Linked + Snapshot)
-    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True, index=True)
     customer_name = db.Column(db.String(150), nullable=False)
     customer_phone = db.Column(db.String(20), nullable=True)
     customer_company = db.Column(db.String(200), nullable=True)  # If B2B customer
@@ -263,9 +339,10 @@ class StockIntakeItem(db.Model):
 class Expense(db.Model):
     """Expense tracking model for business expenses"""
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False)
-    category = db.Column(db.String(50), nullable=False)  # salary, workers, rent, transport, stock_purchase, utilities, other
-    amount = db.Column(db.Float, nullable=False)
+    # active_history: the rollup needs the old month/category/amount even when they were not loaded
+    date = db.column_property(db.Column(db.Date, nullable=False), active_history=True)
+    category = db.column_property(db.Column(db.String(50), nullable=False), active_history=True)  # salary, workers, rent, transport, stock_purchase, utilities, other
+    amount = db.column_property(db.Column(db.Float, nullable=False), active_history=True)
     description = db.Column(db.Text, nullable=True)
     
     # Link to stock intake if this expense is from a stock purchase
@@ -279,9 +356,121 @@ class Expense(db.Model):
     created_by = db.relationship('User', backref='expenses')
     stock_intake = db.relationship('StockIntake', backref='expense')
     
+    # Month views filter on date ranges, optionally within a category
+    __table_args__ = (
+        db.Index('ix_expense_date', 'date'),
+        db.Index('ix_expense_category_date', 'category', 'date'),
+    )
+    
     def __repr__(self):
         return f'<Expense {self.date}: {self.category} - ₹{self.amount}>'
 
+class ExpenseMonthlyRollup(db.Model):
+    """
+    Expense totals per category per month, kept in step with Expense writes
+    made through the session; bulk query.update()/delete() bypass it, so run
+    rebuild_expense_rollup() (`flask rebuild-expense-rollup`) after those.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False)  # First day of the month
+    category = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Float, default=0.0, nullable=False)
+    expense_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('month', 'category', name='unique_expense_month_category'),)
+    
+    def __repr__(self):
+        return f'<ExpenseMonthlyRollup {self.month:%Y-%m} {self.category}: ₹{self.total}>'
+
+def _expense_key_and_amount(expense, use_old=False):
+    """(month, category) and amount of an expense, optionally as loaded before this flush"""
+    values = {}
+    state = inspect(expense)
+    for field in ('date', 'category', 'amount'):
+        history = state.attrs[field].history
+        if use_old and history.deleted:
+            values[field] = history.deleted[0]
+        else:
+            values[field] = getattr(expense, field)
+    month = values['date'].replace(day=1)
+    return (month, values['category']), float(values['amount'] or 0)
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_expense_rollup(session, flush_context):
+    """Apply the net effect of flushed Expense changes to ExpenseMonthlyRollup"""
+    deltas = defaultdict(lambda: [0.0, 0])
+    for obj in session.new:
+        if isinstance(obj, Expense):
+            key, amount = _expense_key_and_amount(obj)
+            deltas[key][0] += amount
+            deltas[key][1] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Expense):
+            key, amount = _expense_key_and_amount(obj, use_old=True)
+            deltas[key][0] -= amount
+            deltas[key][1] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Expense) and session.is_modified(obj, include_collections=False):
+            old_key, old_amount = _expense_key_and_amount(obj, use_old=True)
+            new_key, new_amount = _expense_key_and_amount(obj)
+            deltas[old_key][0] -= old_amount
+            deltas[old_key][1] -= 1
+            deltas[new_key][0] += new_amount
+            deltas[new_key][1] += 1
+    
+    rows = [
+        {'month': month, 'category': category, 'total': total, 'expense_count': count}
+        for (month, category), (total, count) in sorted(deltas.items())
+        if total or count
+    ]
+    if not rows:
+        return
+    
+    connection = session.connection()
+    table = ExpenseMonthlyRollup.__table__
+    if connection.dialect.name in ('postgresql', 'sqlite'):
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['month', 'category'],
+            set_={
+                'total': table.c.total + stmt.excluded.total,
+                'expense_count': table.c.expense_count + stmt.excluded.expense_count
+            }
+        )
+        connection.execute(stmt)
+    else:
+        for row in rows:
+            result = connection.execute(
+                table.update()
+                .where(table.c.month == row['month'], table.c.category == row['category'])
+                .values(total=table.c.total + row['total'],
+                        expense_count=table.c.expense_count + row['expense_count'])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+
+def rebuild_expense_rollup():
+    """Recompute ExpenseMonthlyRollup from the expense table (backfill/repair)"""
+    totals = defaultdict(lambda: [0.0, 0])
+    for expense_date, category, total, count in db.session.query(
+        Expense.date, Expense.category, func.sum(Expense.amount), func.count(Expense.id)
+    ).group_by(Expense.date, Expense.category):
+        key = (expense_date.replace(day=1), category)
+        totals[key][0] += float(total or 0)
+        totals[key][1] += count
+    
+    db.session.query(ExpenseMonthlyRollup).delete()
+    db.session.add_all([
+        ExpenseMonthlyRollup(month=month, category=category, total=total, expense_count=count)
+        for (month, category), (total, count) in totals.items()
+    ])
+    db.session.commit()
+    return len(totals)
+
 class CarVariant(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     car_name = db.Column(db.String(200), nullable=True)
@@ -298,6 +487,12 @@ class TimelineEvent(db.Model):
     timestamp = db.Column(db.DateTime, server_default=func.now())
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     user = db.relationship('User', backref='timeline_events')
+    
+    __table_args__ = (
+        db.Index('ix_timeline_event_type_id', 'event_type', 'id'),
+        db.Index('ix_timeline_event_user_id', 'user_id', 'id'),
+        db.Index('ix_timeline_event_timestamp', 'timestamp'),
+    )
 
 # ============== MULTI-WAREHOUSE MODELS ==============
 
@@ -344,6 +539,7 @@ class StockTransfer(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     transfer_date = db.Column(db.DateTime, server_default=func.now())
     notes = db.Column(db.Text, nullable=True)
+    batch_id = db.Column(db.String(32), nullable=True, index=True)  # Shared by lines of one bulk transfer
     
     # System fields
     created_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -355,6 +551,14 @@ class StockTransfer(db.Model):
     to_warehouse = db.relationship('Warehouse', foreign_keys=[to_warehouse_id], backref='incoming_transfers')
     created_by = db.relationship('User', backref='stock_transfers')
     
+    # Composite indexes matching the history filters and its (transfer_date, id) keyset order
+    __table_args__ = (
+        db.Index('ix_stock_transfer_date_id', 'transfer_date', 'id'),
+        db.Index('ix_stock_transfer_product_date', 'product_id', 'transfer_date'),
+        db.Index('ix_stock_transfer_from_date', 'from_warehouse_id', 'transfer_date'),
+        db.Index('ix_stock_transfer_to_date', 'to_warehouse_id', 'transfer_date'),
+    )
+    
     def __repr__(self):
         return f'<StockTransfer: {self.quantity}x Product#{self.product_id} from {self.from_warehouse_id} to {self.to_warehouse_id}>'
 
@@ -0,0 +1,199 @@
+"""
+On-demand profiling of single requests (admin only)
+Send `X-Profile: cprofile` or `X-Profile: sample` (or `?_profile=...`) with
+an admin token and the request runs under a profiler:
+- cprofile: deterministic call counts and times, saved as .pstats
+- sample: a background thread samples the request thread's stack every
+  PROFILE_SAMPLE_INTERVAL_MS and saves collapsed stacks (.folded), ready for
+  flamegraph.pl or speedscope
+The response carries X-Profile-Id; results are listed and downloaded through
+/api/admin/profiles.
+"""
+import io
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, request
+from routes.utils import get_current_user, verify_request_jwt
+
+PROFILE_MODES = ('cprofile', 'sample')
+PROFILE_EXTENSIONS = {'cprofile': '.pstats', 'sample': '.folded'}
+
+# Only one profiler per process at a time (cProfile cannot nest)
+_profiling_lock = threading.Lock()
+
+class StackSampler:
+    """Samples one thread's call stack at a fixed interval into collapsed stack counts"""
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+def profile_dir(app=None):
+    app = app or current_app
+    return app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+def _requested_mode():
+    mode = (request.headers.get('X-Profile') or request.args.get('_profile') or '').strip().lower()
+    return mode if mode in PROFILE_MODES else None
+
+def _is_admin():
+    verify_request_jwt()
+    if g.jwt_error is not None or not g.jwt_identity:
+        return False
+    user = get_current_user()
+    return bool(user and user.username == 'abby')
+
+def _save(app, mode, profiler, duration, response):
+    """Write the profile and its metadata; returns the profile id"""
+    directory = profile_dir(app)
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    data_path = os.path.join(directory, profile_id + PROFILE_EXTENSIONS[mode])
+    if mode == 'cprofile':
+        profiler.dump_stats(data_path)
+    else:
+        with open(data_path, 'w') as f:
+            f.write(profiler.folded())
+    meta = {
+        'id': profile_id,
+        'mode': mode,
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 2),
+        'samples': sum(profiler.counts.values()) if mode == 'sample' else None,
+        'created_at': datetime.now().isoformat(),
+        'pid': os.getpid(),
+    }
+    with open(os.path.join(directory, profile_id + '.json'), 'w') as f:
+        json.dump(meta, f)
+    _prune(directory, app.config.get('PROFILE_KEEP', 50))
+    return profile_id
+
+def _prune(directory, keep):
+    """Keep only the newest `keep` profiles"""
+    metas = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    for name in metas[:-keep] if keep else []:
+        profile_id = name[:-len('.json')]
+        for extension in ('.json',) + tuple(PROFILE_EXTENSIONS.values()):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+def list_profiles(app=None):
+    """Metadata of the stored profiles, newest first"""
+    directory = profile_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+    return profiles
+
+def get_profile(profile_id, app=None):
+    """(metadata, path of the profile data) or None; profile_id comes from the URL"""
+    if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith('.'):
+        return None
+    directory = profile_dir(app)
+    meta_path = os.path.join(directory, profile_id + '.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    return meta, os.path.join(directory, profile_id + PROFILE_EXTENSIONS[meta['mode']])
+
+def summarize(meta, data_path, limit=30):
+    """Readable top entries: cumulative-time table for cProfile, hottest stacks for samples"""
+    if meta['mode'] == 'cprofile':
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(data_path, stream=output).strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+    with open(data_path) as f:
+        return ''.join(f.readlines()[:limit])
+
+def init_profiling(app):
+    """Profile requests that ask for it, if the caller is an admin"""
+    if not app.config.get('REQUEST_PROFILING', True):
+        return
+
+    @app.before_request
+    def start_profiling():
+        mode = _requested_mode()
+        if mode is None or not _is_admin():
+            return
+        if not _profiling_lock.acquire(blocking=False):
+            g.profile_skipped = 'busy'
+            return
+        if mode == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            interval = app.config.get('PROFILE_SAMPLE_INTERVAL_MS', 5) / 1000
+            profiler = StackSampler(threading.get_ident(), interval)
+            profiler.start()
+        g.profile = (mode, profiler, time.perf_counter())
+
+    @app.after_request
+    def finish_profiling(response):
+        if g.get('profile_skipped'):
+            response.headers['X-Profile-Skipped'] = g.pop('profile_skipped')
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        mode, profiler, started = profile
+        try:
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
+            response.headers['X-Profile-Id'] = _save(app, mode, profiler, time.perf_counter() - started, response)
+        finally:
+            _profiling_lock.release()
+        return response
+
+    @app.teardown_request
+    def abandon_profiling(exc):
+        # after_request does not run if the request failed before a response existed
+        profile = g.pop('profile', None)
+        if profile is not None:
+            mode, profiler, _ = profile
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
+            _profiling_lock.release()
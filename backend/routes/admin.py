@@ -0,0 +1,80 @@
+"""
+Admin-only diagnostics API routes (Abby only)
+"""
+from flask import Blueprint, request, jsonify, current_app, send_file
+import os
+from slow_queries import top_offenders, clear_offenders
+from profiling import list_profiles, get_profile, summarize
+from routes.utils import require_admin
+
+admin_bp = Blueprint('admin_bp', __name__)
+
+SLOW_QUERY_SORTS = ('total_ms', 'count', 'max_ms', 'avg_ms')
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@require_admin
+def get_slow_queries():
+    """
+    Statement shapes slower than SLOW_QUERY_MS, worst first
+    Query params:
+    - sort: total_ms (default), count, max_ms or avg_ms
+    - limit: number of shapes (default 20, max 200)
+    Aggregated in memory by the worker answering the request; the full
+    history, including sampled EXPLAIN plans, is in the slow-query log file.
+    """
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in SLOW_QUERY_SORTS:
+        return jsonify({"msg": f"Invalid sort. Use one of: {', '.join(SLOW_QUERY_SORTS)}"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    offenders = top_offenders(limit=limit, sort=sort)
+    return jsonify({
+        'success': True,
+        'data': offenders,
+        'count': len(offenders),
+        'threshold_ms': current_app.config.get('SLOW_QUERY_MS', 0),
+        'worker_pid': os.getpid()
+    })
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+@require_admin
+def reset_slow_queries():
+    """Forget this worker's slow-query totals (the log file is kept)"""
+    clear_offenders()
+    return jsonify({'success': True, 'msg': 'Slow-query totals cleared'})
+
+@admin_bp.route('/profiles', methods=['GET'])
+@require_admin
+def get_profiles():
+    """
+    Stored request profiles, newest first
+    Profile a request by sending it with `X-Profile: cprofile` (call counts)
+    or `X-Profile: sample` (wall-clock stack samples); its response carries
+    the X-Profile-Id.
+    """
+    profiles = list_profiles()
+    return jsonify({'success': True, 'data': profiles, 'count': len(profiles)})
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@require_admin
+def get_profile_summary(profile_id):
+    """
+    One profile's metadata and a text summary
+    Query params:
+    - limit: rows in the summary (default 30)
+    """
+    found = get_profile(profile_id)
+    if not found:
+        return jsonify({"msg": "Profile not found"}), 404
+    meta, data_path = found
+    limit = min(max(request.args.get('limit', 30, type=int), 1), 500)
+    return jsonify({'success': True, 'data': dict(meta, summary=summarize(meta, data_path, limit))})
+
+@admin_bp.route('/profiles/<profile_id>/download', methods=['GET'])
+@require_admin
+def download_profile(profile_id):
+    """Raw profile: .pstats (load with pstats/snakeviz) or .folded (flamegraph.pl/speedscope)"""
+    found = get_profile(profile_id)
+    if not found:
+        return jsonify({"msg": "Profile not found"}), 404
+    _, data_path = found
+    return send_file(data_path, as_attachment=True, download_name=os.path.basename(data_path))
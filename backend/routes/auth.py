@@ -34,8 +34,9 @@ def login():
     user = User.query.filter_by(username=data.get('username')).first()
 
     if user and user.check_password(data.get('password')):
-        # Include financial access in token claims
+        # Include user id and financial access in token claims
         additional_claims = {
+            "user_id": user.id,
             "can_view_financials": user.can_view_financials,
             "full_name": user.full_name
         }
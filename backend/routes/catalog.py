@@ -1,48 +1,142 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from collections import OrderedDict
+import hashlib
 import json
-from models import db, Product, CarVariant, TimelineEvent, User
-from flask_jwt_extended import jwt_required
+import time
+from models import db, Product, ProductCategory, CarVariant, is_demo_request
 from sqlalchemy.orm import joinedload
-from flask_jwt_extended import get_jwt_identity
+from routes.utils import jwt_required, verify_request_jwt
+from metrics import record_cache_lookup
 
 catalog_bp = Blueprint('catalog_bp', __name__)
 
+# --- Public variants cache ---
+# Serialized variant rows, rebuilt after catalog writes or CATALOG_CACHE_TTL seconds
+_variants_cache = {'built_at': 0.0, 'rows': None, 'pages': OrderedDict()}
+CATALOG_CACHE_PAGES = 256  # Serialized responses kept per worker
+
+def invalidate_catalog_cache():
+    """Drop the cached variant rows and responses (called by the catalog write routes)"""
+    _variants_cache['rows'] = None
+    _variants_cache['pages'].clear()
+
+def _serialize_variant(v):
+    product_data = v.product
+    return {
+        'id': v.id,
+        'car_name': v.car_name,
+        'variant_name': v.name,
+        'sunroof_type': v.sunroof_type,
+        'sunroof_length_in': v.sunroof_length_in,
+        'sunroof_width_in': None,  # No width column on CarVariant
+        'clip_positions': json.loads(v.clip_positions) if v.clip_positions else [],
+        'product_id': product_data.id if product_data else None,
+        'description': product_data.description if product_data else '',
+        'stock_level': product_data.stock_quantity if product_data else 0,
+        'with_frame': False,  # Field not in current model
+        'images': [product_data.image_url] if (product_data and product_data.image_url) else [],
+        'purchase_price': product_data.purchase_price if product_data else None,
+        'selling_price': product_data.selling_price if product_data else None,
+    }
+
+def _load_variant_rows():
+    variants = CarVariant.query.options(joinedload(CarVariant.product)).order_by(
+        CarVariant.car_name, CarVariant.name
+    ).all()
+    return [_serialize_variant(v) for v in variants]
+
+def _get_variant_rows():
+    """All variants serialized once, in catalog order (demo requests are never cached)"""
+    if is_demo_request():
+        return _load_variant_rows()
+    ttl = current_app.config.get('CATALOG_CACHE_TTL', 60)
+    if _variants_cache['rows'] is None or time.time() - _variants_cache['built_at'] >= ttl:
+        invalidate_catalog_cache()
+        _variants_cache['rows'] = _load_variant_rows()
+        _variants_cache['built_at'] = time.time()
+    return _variants_cache['rows']
+
+def _can_view_financials():
+    """Financial fields are only served to a valid token with financial access"""
+    return bool(verify_request_jwt().get('can_view_financials', False))
+
 # --- Unified Car Variant & Product Routes ---
 @catalog_bp.route('/variants', methods=['GET'])
 def get_variants():
-    query = CarVariant.query.options(joinedload(CarVariant.product)).order_by(CarVariant.car_name, CarVariant.name)
-    
-    search_term = request.args.get('search', '')
-    if search_term:
-        search_pattern = f"%{search_term}%"
-        query = query.filter(
-            db.or_(
-                CarVariant.car_name.ilike(search_pattern),
-                CarVariant.name.ilike(search_pattern)
-            )
-        )
-
-    variants = query.all()
-    results = []
-    for v in variants:
-        product_data = v.product
-        results.append({
-            'id': v.id,
-            'car_name': v.car_name,
-            'variant_name': v.name,
-            'sunroof_type': v.sunroof_type,
-            'sunroof_length_in': v.sunroof_length_in,
-            'sunroof_width_in': v.sunroof_width_in,
-            'clip_positions': json.loads(v.clip_positions) if v.clip_positions else [],
-            'product_id': product_data.id if product_data else None,
-            'description': product_data.description if product_data else '',
-            'stock_level': product_data.stock_quantity if product_data else 0,
-            'with_frame': False,  # Field not in current model
-            'images': [product_data.image_url] if (product_data and product_data.image_url) else [],
-            'purchase_price': product_data.purchase_price if product_data else None,
-            'selling_price': product_data.selling_price if product_data else None,
-        })
-    return jsonify(results)
+    """
+    Public catalog of car variants
+    Query params:
+    - search: match car or variant name
+    - page, per_page: paginate (the full list is returned when omitted)
+    Responses are served from a per-worker cache with an ETag; anonymous
+    responses may be cached by the CDN, financial ones only by the browser.
+    """
+    search_term = request.args.get('search', '').strip()
+    page = request.args.get('page', type=int)
+    per_page = request.args.get('per_page', type=int)
+    paginated = bool(page or per_page)
+    if paginated:
+        page = max(page or 1, 1)
+        per_page = min(max(per_page or 50, 1), 100)
+    financial = _can_view_financials()
+
+    rows = _get_variant_rows()
+    key = (financial, search_term.lower(), page, per_page)
+    pages = {} if is_demo_request() else _variants_cache['pages']
+    cached = pages.get(key)
+    if pages is _variants_cache['pages']:
+        record_cache_lookup('catalog_variants', cached is not None)
+    if cached is None:
+        if search_term:
+            needle = search_term.lower()
+            rows = [
+                r for r in rows
+                if needle in (r['car_name'] or '').lower() or needle in (r['variant_name'] or '').lower()
+            ]
+        total = len(rows)
+        if paginated:
+            rows = rows[(page - 1) * per_page:page * per_page]
+        if not financial:
+            rows = [dict(r, purchase_price=None) for r in rows]
+        if paginated:
+            payload = {
+                'success': True,
+                'data': rows,
+                'count': len(rows),
+                'pagination': {
+                    'page': page,
+                    'per_page': per_page,
+                    'total': total,
+                    'pages': (total + per_page - 1) // per_page
+                }
+            }
+        else:
+            payload = rows
+        body = json.dumps(payload, separators=(',', ':'))
+        cached = (body, hashlib.md5(body.encode()).hexdigest())
+        pages[key] = cached
+        if len(pages) > CATALOG_CACHE_PAGES:
+            pages.popitem(last=False)
+
+    body, etag = cached
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Authorization')
+    response.cache_control.max_age = current_app.config.get('CATALOG_CACHE_TTL', 60)
+    if financial:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response.make_conditional(request)
+
+def _new_variant_product(variant, **fields):
+    """Sunroof product for a flushed variant, with the required code, name and category filled in"""
+    return Product(
+        product_code=f"SU-V{variant.id}",
+        name=' '.join(part for part in (variant.car_name, variant.name) if part),
+        category=ProductCategory.SUNROOF,
+        **fields
+    )
 
 @catalog_bp.route('/variants', methods=['POST'])
 @jwt_required()
@@ -54,11 +148,12 @@ def create_variant():
         name=data.get('variant_name', 'New Variant'),
         sunroof_type=data.get('sunroof_type', 'N/A'),
         sunroof_length_in=data.get('sunroof_length_in'),
-        sunroof_width_in=data.get('sunroof_width_in'),
         clip_positions=json.dumps(data.get('clip_positions') or data.get('clips', []))
     )
 
-    product = Product(
+    db.session.add(new_variant)
+    db.session.flush()
+    product = _new_variant_product(new_variant,
         description=data.get('description', ''),
         stock_quantity=data.get('stock_level') or data.get('stock') or data.get('quantity', 0),
         purchase_price=data.get('purchase_price'),
@@ -67,40 +162,21 @@ def create_variant():
     )
 
     new_variant.product = product
-    db.session.add(new_variant)
-    
-    # Log timeline event
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    event = TimelineEvent(
-        event_type='PRODUCT_ADD',
-        description=f"New sunroof \'{new_variant.name}\' for \'{new_variant.car_name}\' added to catalog.",
-        user_id=user.id if user else None
-    )
-    db.session.add(event)
-
     db.session.commit()
+    invalidate_catalog_cache()
     return jsonify({'msg': 'Variant created', 'id': new_variant.id}), 201
 
 @catalog_bp.route('/variants/<int:variant_id>', methods=['PUT'])
 @jwt_required()
 def update_variant_with_product(variant_id):
     variant = CarVariant.query.get_or_404(variant_id)
-    product = variant.product or Product()
+    product = variant.product or _new_variant_product(variant)
     data = request.get_json()
 
-    # Track changes for timeline
-    changes = []
-    if variant.name != data.get('variant_name', variant.name):
-        changes.append(f"name to \'{data.get('variant_name')}\'")
-    if product.stock_level != data.get('stock_level', product.stock_level):
-        changes.append(f"stock to {data.get('stock_level')}")
-
     variant.car_name = data.get('car_name', variant.car_name)
     variant.name = data.get('variant_name') or data.get('name', variant.name)
     variant.sunroof_type = data.get('sunroof_type', variant.sunroof_type)
     variant.sunroof_length_in = data.get('sunroof_length_in', variant.sunroof_length_in)
-    variant.sunroof_width_in = data.get('sunroof_width_in', variant.sunroof_width_in)
     variant.clip_positions = json.dumps(data.get('clip_positions') or data.get('clips', []))
 
     product.description = data.get('description', product.description)
@@ -113,37 +189,15 @@ def update_variant_with_product(variant_id):
 
     variant.product = product
 
-    # Log timeline event
-    if changes:
-        username = get_jwt_identity()
-        user = User.query.filter_by(username=username).first()
-        event = TimelineEvent(
-            event_type='PRODUCT_UPDATE',
-            description=f"Details for \'{variant.name}\' updated: { ', '.join(changes) }.",
-            user_id=user.id if user else None
-        )
-        db.session.add(event)
-
     db.session.commit()
+    invalidate_catalog_cache()
     return jsonify({'msg': 'Variant and Product updated'})
 
 @catalog_bp.route('/variants/<int:variant_id>', methods=['DELETE'])
 @jwt_required()
 def delete_variant(variant_id):
     variant = CarVariant.query.get_or_404(variant_id)
-    variant_name = variant.name
-    car_name = variant.car_name
-    
-    # Log timeline event
-    username = get_jwt_identity()
-    user = User.query.filter_by(username=username).first()
-    event = TimelineEvent(
-        event_type='PRODUCT_DELETE',
-        description=f"Sunroof \'{variant_name}\' for \'{car_name}\' deleted from catalog.",
-        user_id=user.id if user else None
-    )
-    db.session.add(event)
-
     db.session.delete(variant)
     db.session.commit()
+    invalidate_catalog_cache()
     return jsonify({"msg": "Variant deleted"})
@@ -1,16 +1,58 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
-from models import db, Customer
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from sqlalchemy import func, literal, or_, union_all, update
+from collections import defaultdict
+from datetime import datetime, timedelta
+import csv
+import io
+import json
+from models import db, Customer, Sale, Payment, normalize_phone
+from routes.utils import jwt_required, get_current_user
 
 customers_bp = Blueprint('customers_bp', __name__)
 
+CUSTOMER_SORTS = {
+    'name': Customer.name,
+    'revenue': 'lifetime_revenue',
+    'outstanding': 'outstanding_balance',
+    'last_purchase': 'last_purchase_date',
+    'invoices': 'invoice_count',
+}
+
 @customers_bp.route('', methods=['GET'])
 @jwt_required()
 def get_customers():
-    """Get all customers, optionally filtered by name/phone"""
+    """
+    Get customers with lifetime sales statistics, optionally filtered by name/phone
+    Query params:
+    - search: search in name, phone and company
+    - sort: name, revenue, outstanding, last_purchase, invoices (default: name)
+    - order: asc or desc (default: asc for name, desc otherwise)
+    - page, per_page: paginate (all customers are returned when omitted)
+    Statistics come from one grouped join on sale.
+    """
     search = request.args.get('search', '').lower()
+    sort = request.args.get('sort', 'name')
+    if sort not in CUSTOMER_SORTS:
+        return jsonify({"msg": f"Invalid sort. Use one of: {', '.join(CUSTOMER_SORTS)}"}), 400
+    order = request.args.get('order', 'asc' if sort == 'name' else 'desc')
+    
+    stats = db.session.query(
+        Sale.customer_id.label('customer_id'),
+        func.count(Sale.id).label('invoice_count'),
+        func.sum(Sale.total_amount).label('lifetime_revenue'),
+        func.sum(Sale.total_amount - func.coalesce(Sale.amount_paid, 0)).label('outstanding_balance'),
+        func.max(Sale.sale_date).label('last_purchase_date')
+    ).filter(Sale.customer_id.isnot(None)).group_by(Sale.customer_id).subquery()
+    
+    query = db.session.query(
+        Customer,
+        func.coalesce(stats.c.invoice_count, 0).label('invoice_count'),
+        func.coalesce(stats.c.lifetime_revenue, 0).label('lifetime_revenue'),
+        func.coalesce(stats.c.outstanding_balance, 0).label('outstanding_balance'),
+        stats.c.last_purchase_date,
+        func.count().over().label('total_count')
+    ).outerjoin(stats, stats.c.customer_id == Customer.id)
     
-    query = Customer.query
     if search:
         query = query.filter(
             (Customer.name.ilike(f'%{search}%')) |
@@ -18,9 +60,30 @@ def get_customers():
             (Customer.company.ilike(f'%{search}%'))
         )
     
-    customers = query.order_by(Customer.name).all()
+    sort_column = CUSTOMER_SORTS[sort]
+    if isinstance(sort_column, str):
+        sort_column = func.coalesce(stats.c[sort_column], 0) if sort != 'last_purchase' else stats.c[sort_column]
+    if order == 'desc':
+        query = query.order_by(sort_column.desc().nulls_last(), Customer.id.desc())
+    else:
+        query = query.order_by(sort_column.asc().nulls_last(), Customer.id)
     
-    return jsonify({
+    page = request.args.get('page', type=int)
+    per_page = request.args.get('per_page', type=int)
+    if page or per_page:
+        page = max(page or 1, 1)
+        per_page = min(max(per_page or 50, 1), 200)
+        rows = query.limit(per_page).offset((page - 1) * per_page).all()
+    else:
+        rows = query.all()
+    
+    # total_count is a window over the filtered set; past the last page, count separately
+    if rows:
+        total = rows[0].total_count
+    else:
+        total = query.count() if page and page > 1 else 0
+    
+    response = {
         'success': True,
         'data': [{
             'id': c.id,
@@ -29,8 +92,120 @@ def get_customers():
             'company': c.company,
             'city': c.city,
             'address': c.address,
-            'created_at': c.created_at.isoformat() if c.created_at else None
-        } for c in customers]
+            'created_at': c.created_at.isoformat() if c.created_at else None,
+            'invoice_count': invoice_count,
+            'lifetime_revenue': float(lifetime_revenue),
+            'outstanding_balance': float(outstanding_balance),
+            'last_purchase_date': last_purchase_date.isoformat() if last_purchase_date else None
+        } for c, invoice_count, lifetime_revenue, outstanding_balance, last_purchase_date, _ in rows],
+        'count': total
+    }
+    if page:
+        response['pagination'] = {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
+    return jsonify(response)
+
+@customers_bp.route('/lookup', methods=['GET'])
+@jwt_required()
+def lookup_customer_by_phone():
+    """
+    Find customers by phone number, whatever its formatting
+    Query params:
+    - phone: full number (indexed equality on the normalized phone) or at
+      least 4 trailing digits (suffix match, as an indexed prefix match on
+      the reversed digits)
+    """
+    digits = normalize_phone(request.args.get('phone', ''))
+    if not digits or len(digits) < 4:
+        return jsonify({'msg': 'Provide at least 4 digits of the phone number'}), 400
+    
+    query = Customer.query
+    if len(digits) == 10:
+        query = query.filter(Customer.phone_normalized == digits)
+    else:
+        # Digits only, so there are no LIKE wildcards to escape
+        query = query.filter(Customer.phone_reversed.like(f'{digits[::-1]}%'))
+    customers = query.order_by(Customer.name).limit(20).all()
+    
+    return jsonify({
+        'success': True,
+        'data': [{
+            'id': c.id,
+            'name': c.name,
+            'phone': c.phone,
+            'company': c.company,
+            'city': c.city,
+            'address': c.address
+        } for c in customers],
+        'count': len(customers)
+    })
+
+def backfill_customer_phones():
+    """Fill phone_normalized/phone_reversed for customers saved before the columns existed"""
+    customers = Customer.query.filter(
+        Customer.phone.isnot(None),
+        or_(Customer.phone_normalized.is_(None), Customer.phone_reversed.is_(None))
+    ).all()
+    for customer in customers:
+        customer.phone_normalized = normalize_phone(customer.phone)
+        customer.phone_reversed = customer.phone_normalized[::-1] if customer.phone_normalized else None
+    db.session.commit()
+    return len(customers)
+
+def link_sales_to_customers(batch_size=1000):
+    """
+    Set customer_id on historical sales that only carry a phone snapshot.
+    A sale is linked only when exactly one customer has the same normalized phone.
+    Returns (linked, ambiguous, unmatched) counts.
+    """
+    customers_by_phone = defaultdict(list)
+    for customer_id, phone in db.session.query(Customer.id, Customer.phone_normalized).filter(
+        Customer.phone_normalized.isnot(None)
+    ):
+        customers_by_phone[phone].append(customer_id)
+    
+    updates = []
+    ambiguous = unmatched = 0
+    for sale_id, phone in db.session.query(Sale.id, Sale.customer_phone).filter(
+        Sale.customer_id.is_(None),
+        Sale.customer_phone.isnot(None)
+    ):
+        matches = customers_by_phone.get(normalize_phone(phone), [])
+        if len(matches) == 1:
+            updates.append({'id': sale_id, 'customer_id': matches[0]})
+        elif matches:
+            ambiguous += 1
+        else:
+            unmatched += 1
+    
+    # Bulk UPDATE by primary key, in batches
+    for i in range(0, len(updates), batch_size):
+        db.session.execute(update(Sale), updates[i:i + batch_size])
+    db.session.commit()
+    return len(updates), ambiguous, unmatched
+
+@customers_bp.route('/link-sales', methods=['POST'])
+@jwt_required()
+def link_sales():
+    """
+    One-time job: link sales with no customer_id to the customer with the same phone.
+    Only works for Abby (admin).
+    """
+    user = get_current_user()
+    if not user or user.username != 'abby':
+        return jsonify({"msg": "Only admin can run migrations"}), 403
+    
+    linked, ambiguous, unmatched = link_sales_to_customers()
+    return jsonify({
+        'success': True,
+        'msg': f'Linked {linked} sales to customers',
+        'linked': linked,
+        'ambiguous': ambiguous,
+        'unmatched': unmatched
     })
 
 @customers_bp.route('', methods=['POST'])
@@ -69,6 +244,142 @@ def create_customer():
         db.session.rollback()
         return jsonify({'msg': str(e)}), 500
 
+def _statement_ledger(customer_id):
+    """
+    Invoices (debits) and payments (credits) of one customer as a subquery,
+    with a running balance computed by a window function over the full history.
+    Amounts marked paid on an invoice without a Payment row (initial payment or
+    manual payment update) appear as a payment dated on the invoice.
+    """
+    recorded = db.session.query(
+        Payment.sale_id.label('sale_id'),
+        func.sum(Payment.amount).label('paid')
+    ).join(Sale, Sale.id == Payment.sale_id).filter(
+        Sale.customer_id == customer_id
+    ).group_by(Payment.sale_id).subquery()
+    
+    invoices = db.session.query(
+        Sale.sale_date.label('entry_date'),
+        literal(0).label('entry_order'),
+        literal('invoice').label('entry_type'),
+        Sale.id.label('entry_id'),
+        Sale.invoice_number.label('reference'),
+        Sale.total_amount.label('debit'),
+        literal(0.0).label('credit')
+    ).filter(Sale.customer_id == customer_id)
+    
+    payments = db.session.query(
+        Payment.payment_date.label('entry_date'),
+        literal(1).label('entry_order'),
+        literal('payment').label('entry_type'),
+        Payment.id.label('entry_id'),
+        Sale.invoice_number.label('reference'),
+        literal(0.0).label('debit'),
+        Payment.amount.label('credit')
+    ).join(Sale, Sale.id == Payment.sale_id).filter(Sale.customer_id == customer_id)
+    
+    unrecorded = Sale.amount_paid - func.coalesce(recorded.c.paid, 0)
+    invoice_payments = db.session.query(
+        Sale.sale_date.label('entry_date'),
+        literal(1).label('entry_order'),
+        literal('payment').label('entry_type'),
+        Sale.id.label('entry_id'),
+        Sale.invoice_number.label('reference'),
+        literal(0.0).label('debit'),
+        unrecorded.label('credit')
+    ).outerjoin(recorded, recorded.c.sale_id == Sale.id).filter(
+        Sale.customer_id == customer_id,
+        unrecorded > 0.01
+    )
+    
+    entries = union_all(invoices.statement, payments.statement, invoice_payments.statement).subquery()
+    balance = func.sum(entries.c.debit - entries.c.credit).over(
+        order_by=(entries.c.entry_date, entries.c.entry_order, entries.c.entry_id),
+        rows=(None, 0)
+    )
+    return db.session.query(*entries.c, balance.label('balance')).subquery()
+
+@customers_bp.route('/<int:id>/statement', methods=['GET'])
+@jwt_required()
+def get_customer_statement(id):
+    """
+    Account statement: invoices and payments in date order with running balance
+    Query params:
+    - from, to: inclusive date range (YYYY-MM-DD); earlier entries make up the opening balance
+    - format: json (default) or csv
+    The response is streamed, so long histories are never held in memory at once.
+    """
+    customer = Customer.query.get_or_404(id)
+    
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"msg": "Invalid date format. Use YYYY-MM-DD"}), 400
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'csv'):
+        return jsonify({"msg": "Invalid format. Use json or csv"}), 400
+    
+    ledger = _statement_ledger(customer.id)
+    
+    opening_balance = 0.0
+    if start:
+        opening_balance = float(db.session.query(
+            func.coalesce(func.sum(ledger.c.debit - ledger.c.credit), 0)
+        ).filter(ledger.c.entry_date < start).scalar())
+    
+    query = db.session.query(ledger)
+    if start:
+        query = query.filter(ledger.c.entry_date >= start)
+    if end:
+        query = query.filter(ledger.c.entry_date < end)
+    rows = query.order_by(
+        ledger.c.entry_date, ledger.c.entry_order, ledger.c.entry_id
+    ).execution_options(yield_per=500)
+    
+    def entry(row):
+        return {
+            'date': row.entry_date.isoformat() if row.entry_date else None,
+            'type': row.entry_type,
+            'reference': row.reference,
+            'debit': float(row.debit or 0),
+            'credit': float(row.credit or 0),
+            'balance': float(row.balance)
+        }
+    
+    customer_info = {'id': customer.id, 'name': customer.name, 'phone': customer.phone, 'company': customer.company}
+    
+    if output_format == 'csv':
+        def generate_csv():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(['date', 'type', 'reference', 'debit', 'credit', 'balance'])
+            writer.writerow([start.date().isoformat() if start else '', 'opening_balance', '', '', '', opening_balance])
+            for row in rows:
+                e = entry(row)
+                writer.writerow([e['date'], e['type'], e['reference'], e['debit'], e['credit'], e['balance']])
+                if buffer.tell() > 8192:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        
+        filename = f'statement-{customer.id}.csv'
+        return Response(stream_with_context(generate_csv()), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    def generate_json():
+        yield '{"success": true, "data": {"customer": %s, "opening_balance": %s, "entries": [' % (
+            json.dumps(customer_info), json.dumps(opening_balance))
+        closing_balance = opening_balance
+        for i, row in enumerate(rows):
+            e = entry(row)
+            closing_balance = e['balance']
+            yield (',' if i else '') + json.dumps(e)
+        yield '], "closing_balance": %s}}' % json.dumps(closing_balance)
+    
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
 @customers_bp.route('/<int:id>', methods=['PUT'])
 @jwt_required()
 def update_customer(id):
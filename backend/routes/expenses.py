@@ -2,22 +2,33 @@
 Expenses API routes for tracking business costs
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
-from sqlalchemy import func, extract
+from sqlalchemy import func
 from datetime import datetime, date
-from models import db, Expense
-from routes.utils import get_current_user
+from models import db, Expense, ExpenseMonthlyRollup
+from routes.utils import jwt_required, get_current_user_id
 
 expenses_bp = Blueprint('expenses_bp', __name__)
 
+def month_range(month):
+    """
+    Turn 'YYYY-MM' into a half-open [start, end) date range so filters can use
+    the date index. Month '00' means the whole year. Raises ValueError.
+    """
+    year, month_num = map(int, month.split('-'))
+    if month_num == 0:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    start = date(year, month_num, 1)
+    end = date(year + 1, 1, 1) if month_num == 12 else date(year, month_num + 1, 1)
+    return start, end
+
 @expenses_bp.route('', methods=['POST'])
 @jwt_required()
 def create_expense():
     """Create a new expense record"""
     data = request.get_json()
-    user = get_current_user()
+    user_id = get_current_user_id()
     
-    if not user:
+    if not user_id:
         return jsonify({"msg": "User not found"}), 404
     
     # Validate
@@ -34,7 +45,7 @@ def create_expense():
         category=data['category'],
         amount=float(data['amount']),
         description=data.get('description'),
-        created_by_user_id=user.id
+        created_by_user_id=user_id
     )
     
     db.session.add(expense)
@@ -63,17 +74,11 @@ def get_expenses():
     
     if month:
         try:
-            year, month_num = map(int, month.split('-'))
-            if month_num == 0:
-                # Full year filter (month=00 means all months)
-                query = query.filter(extract('year', Expense.date) == year)
-            else:
-                query = query.filter(
-                    extract('year', Expense.date) == year,
-                    extract('month', Expense.date) == month_num
-                )
+            # month=YYYY-00 means the full year
+            start, end = month_range(month)
         except ValueError:
             return jsonify({"msg": "Invalid month format. Use YYYY-MM"}), 400
+        query = query.filter(Expense.date >= start, Expense.date < end)
     
     if category:
         query = query.filter(Expense.category == category)
@@ -99,21 +104,20 @@ def get_expenses_summary():
     month = request.args.get('month', datetime.now().strftime('%Y-%m'))
     
     try:
-        year, month_num = map(int, month.split('-'))
+        # month=YYYY-00 means the full year
+        start, end = month_range(month)
     except ValueError:
         return jsonify({"msg": "Invalid month format. Use YYYY-MM"}), 400
     
-    # Get expenses grouped by category
-    query = db.session.query(
-        Expense.category,
-        func.sum(Expense.amount).label('total')
-    ).filter(extract('year', Expense.date) == year)
-    
-    if month_num != 0:
-        # Filter by specific month (0 means full year)
-        query = query.filter(extract('month', Expense.date) == month_num)
-    
-    category_totals = query.group_by(Expense.category).all()
+    # Read category totals from the monthly rollup
+    category_totals = db.session.query(
+        ExpenseMonthlyRollup.category,
+        func.sum(ExpenseMonthlyRollup.total).label('total')
+    ).filter(
+        ExpenseMonthlyRollup.month >= start,
+        ExpenseMonthlyRollup.month < end,
+        ExpenseMonthlyRollup.expense_count > 0
+    ).group_by(ExpenseMonthlyRollup.category).all()
     
     total = sum(ct.total for ct in category_totals)
     
@@ -2,13 +2,19 @@
 Product API routes for SunroofOS wholesale inventory system
 Supports filtering by category, size, stock status, and vehicle compatibility
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from bisect import bisect_left, bisect_right
 import json
-from flask_jwt_extended import jwt_required, get_jwt
-from sqlalchemy import and_, or_
-from sqlalchemy.orm import joinedload
-from models import db, Product, ProductCategory, ProductStock, Warehouse
-from .utils import get_current_user
+import math
+import re
+import threading
+import time
+from flask_jwt_extended import get_jwt
+from sqlalchemy import and_, or_, event, func, inspect
+from sqlalchemy.orm import Session, joinedload
+from models import db, Product, ProductCategory, ProductStock, Warehouse, CarVariant, parse_year_range, is_demo_request
+from .utils import jwt_required, get_current_user
+from metrics import record_cache_lookup
 
 products_bp = Blueprint('products_bp', __name__)
 
@@ -23,6 +29,7 @@ def get_products():
     - min_width, max_width: filter by width in mm
     - stock_status: all, in_stock, low_stock, out_of_stock
     - search: search in name, product_code, year
+    - year: only products whose year range covers this model year
     - is_active: true/false (default: true)
     - warehouse_id: filter by stock at specific warehouse
     """
@@ -72,6 +79,14 @@ def get_products():
     elif stock_status == 'in_stock':
         query = query.filter(Product.stock_quantity > 0)
     
+    # Filter by model year (parsed range, uses ix_product_year_range)
+    year = request.args.get('year', type=int)
+    if year:
+        query = query.filter(
+            Product.year_from <= year,
+            or_(Product.year_to >= year, Product.year_to.is_(None))
+        )
+    
     # Search
     search = request.args.get('search')
     if search:
@@ -423,3 +438,321 @@ def adjust_stock(product_id):
             'adjustment': adjustment
         }
     })
+
+# ============== DIMENSION FIT MATCHING ==============
+
+def parse_dimension(value):
+    """
+    Convert a shop-notation dimension to decimal inches.
+    Dimensions are written as inches.sixteenths, so "19.3" is 19 3/16"
+    and "19.10" is 19 10/16". Values whose fraction cannot be sixteenths
+    (e.g. "19.1875") are read as plain decimal inches.
+    Returns None for blank or unparseable values.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text:
+        return None
+    whole, _, fraction = text.partition('.')
+    try:
+        if not fraction:
+            return float(whole)
+        if len(fraction) <= 2 and int(fraction) < 16:
+            return int(whole or 0) + int(fraction) / 16
+        return float(text)
+    except ValueError:
+        return None
+
+def parse_clip_positions(value):
+    """Normalise stored clip positions (JSON list or free text) to a set of labels"""
+    if not value:
+        return frozenset()
+    positions = value
+    if isinstance(value, str):
+        try:
+            positions = json.loads(value)
+        except ValueError:
+            positions = re.split(r'[,/;]', value)
+    if isinstance(positions, str):
+        positions = [positions]
+    return frozenset(str(p).strip().lower() for p in positions if str(p).strip())
+
+class FitIndex:
+    """
+    Active products with a known length, sorted by length.
+    Lookups bisect the length array for the tolerance window and then
+    check width, so a query touches only the candidates in that window.
+    """
+    def __init__(self, rows):
+        entries = []
+        for product_id, length, width, clips in rows:
+            length_in = parse_dimension(length)
+            if length_in is None:
+                continue
+            entries.append((length_in, parse_dimension(width), product_id, parse_clip_positions(clips)))
+        entries.sort(key=lambda e: (e[0], e[2]))
+        self.lengths = [e[0] for e in entries]
+        self.widths = [e[1] for e in entries]
+        self.product_ids = [e[2] for e in entries]
+        self.clips = [e[3] for e in entries]
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def candidates(self, length, width, tolerance):
+        """Yield (product_id, length, width, clips) within tolerance on every given axis"""
+        lo = bisect_left(self.lengths, length - tolerance)
+        hi = bisect_right(self.lengths, length + tolerance)
+        for i in range(lo, hi):
+            if width is not None:
+                if self.widths[i] is None or abs(self.widths[i] - width) > tolerance:
+                    continue
+            yield self.product_ids[i], self.lengths[i], self.widths[i], self.clips[i]
+
+_fit_index = None
+_fit_index_stale = True
+_fit_index_lock = threading.Lock()
+
+def invalidate_fit_index():
+    """Mark the fit index for a rebuild on the next lookup"""
+    global _fit_index_stale
+    _fit_index_stale = True
+
+def _load_fit_index():
+    rows = db.session.query(
+        Product.id, Product.length_mm, Product.width_mm, CarVariant.clip_positions
+    ).outerjoin(CarVariant, CarVariant.id == Product.car_variant_id).filter(
+        Product.is_active == True
+    ).all()
+    return FitIndex(rows)
+
+def get_fit_index():
+    """Return the fit index, rebuilding it if stale or older than FIT_INDEX_TTL"""
+    global _fit_index, _fit_index_stale
+    if is_demo_request():
+        # The demo database gets a throwaway index so the two never mix
+        return _load_fit_index()
+    ttl = current_app.config.get('FIT_INDEX_TTL', 300)
+    index = _fit_index
+    if index is not None and not _fit_index_stale and time.time() - index.built_at < ttl:
+        record_cache_lookup('fit_index', True)
+        return index
+    record_cache_lookup('fit_index', False)
+    with _fit_index_lock:
+        if _fit_index is None or _fit_index_stale or time.time() - _fit_index.built_at >= ttl:
+            # Clear the flag first so a write during the rebuild marks it stale again
+            _fit_index_stale = False
+            _fit_index = _load_fit_index()
+        return _fit_index
+
+FIT_INDEX_FIELDS = ('length_mm', 'width_mm', 'is_active', 'car_variant_id')
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_fit_index(session, flush_context):
+    """Product dimension, status or clip changes make the fit index stale"""
+    if _fit_index_stale:
+        return
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, (Product, CarVariant)):
+            invalidate_fit_index()
+            return
+    for obj in session.dirty:
+        if isinstance(obj, Product):
+            attrs = inspect(obj).attrs
+            if any(attrs[field].history.has_changes() for field in FIT_INDEX_FIELDS):
+                invalidate_fit_index()
+                return
+        elif isinstance(obj, CarVariant) and inspect(obj).attrs.clip_positions.history.has_changes():
+            invalidate_fit_index()
+            return
+
+@products_bp.route('/fit', methods=['GET'])
+@jwt_required()
+def get_fitting_products():
+    """
+    In-stock products that fit a given opening, closest first
+    Query params:
+    - length: required, inches.sixteenths (e.g. 19.3 = 19 3/16")
+    - width: optional, same notation
+    - tolerance: allowed difference per axis in decimal inches (default: 0.25)
+    - clips: optional comma-separated clip positions to score against
+    - variant_id: optional car variant to take length (decimal inches) and clips from
+    - limit: max results (default: 20, max: 100)
+    Products are ranked by dimensional distance. When clip positions are
+    given, the score blends closeness (70%) with clip overlap (30%).
+    """
+    length = parse_dimension(request.args.get('length'))
+    width = parse_dimension(request.args.get('width'))
+    clips = parse_clip_positions(request.args.get('clips'))
+
+    variant_id = request.args.get('variant_id', type=int)
+    if variant_id:
+        variant = CarVariant.query.get_or_404(variant_id)
+        if length is None and variant.sunroof_length_in:
+            # Stored as a float in decimal inches, not shop notation
+            length = float(variant.sunroof_length_in)
+        if not clips:
+            clips = parse_clip_positions(variant.clip_positions)
+
+    if length is None:
+        return jsonify({"msg": "A valid 'length' (or a variant with a sunroof length) is required"}), 400
+    if request.args.get('width') and width is None:
+        return jsonify({"msg": "Invalid 'width'"}), 400
+
+    tolerance = request.args.get('tolerance', 0.25, type=float)
+    if tolerance is None or tolerance < 0:
+        return jsonify({"msg": "'tolerance' must be a non-negative number"}), 400
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+
+    index = get_fit_index()
+    axes = 2 if width is not None else 1
+    max_distance = tolerance * math.sqrt(axes)
+    matches = []
+    for product_id, p_length, p_width, p_clips in index.candidates(length, width, tolerance):
+        distance = (p_length - length) ** 2
+        if width is not None:
+            distance += (p_width - width) ** 2
+        distance = math.sqrt(distance)
+        closeness = 1 - distance / max_distance if max_distance else 1.0
+        clip_score = None
+        score = closeness
+        if clips:
+            clip_score = len(clips & p_clips) / len(clips | p_clips)
+            score = 0.7 * closeness + 0.3 * clip_score
+        matches.append((score, distance, product_id, clip_score))
+
+    # Stock moves through many code paths, so it is read fresh for the candidates only
+    in_stock = {}
+    if matches:
+        in_stock = {
+            p.id: p for p in Product.query.filter(
+                Product.id.in_([m[2] for m in matches]),
+                Product.is_active == True,
+                Product.stock_quantity > 0
+            ).all()
+        }
+    matches = [m for m in matches if m[2] in in_stock]
+    matches.sort(key=lambda m: (-m[0], m[1], m[2]))
+
+    results = []
+    for score, distance, product_id, clip_score in matches[:limit]:
+        product = in_stock[product_id]
+        results.append({
+            'id': product.id,
+            'product_code': product.product_code,
+            'name': product.name,
+            'category': product.category.value if product.category else None,
+            'length_mm': product.length_mm,
+            'width_mm': product.width_mm,
+            'length_in': parse_dimension(product.length_mm),
+            'width_in': parse_dimension(product.width_mm),
+            'stock_quantity': product.stock_quantity,
+            'selling_price': product.selling_price,
+            'distance': round(distance, 4),
+            'clip_score': round(clip_score, 4) if clip_score is not None else None,
+            'score': round(score, 4)
+        })
+
+    return jsonify({
+        'success': True,
+        'data': results,
+        'count': len(results),
+        'query': {
+            'length_in': length,
+            'width_in': width,
+            'tolerance': tolerance,
+            'clips': sorted(clips)
+        }
+    })
+
+# ============== VEHICLE FITMENT ==============
+
+def backfill_product_years():
+    """
+    Fill year_from/year_to for products saved before the columns existed, and
+    re-parse open-ended ranges (an earlier parser took words like "snow" as "now")
+    Returns the number of products whose range changed.
+    """
+    products = Product.query.filter(
+        Product.year.isnot(None),
+        or_(Product.year_from.is_(None), Product.year_to.is_(None))
+    ).all()
+    parsed = 0
+    for product in products:
+        years = parse_year_range(product.year)
+        if years != (product.year_from, product.year_to):
+            product.year_from, product.year_to = years
+            parsed += 1
+    db.session.commit()
+    return parsed
+
+@products_bp.route('/fitment', methods=['GET'])
+@jwt_required()
+def get_fitment():
+    """
+    Products that fit a vehicle of a given model year
+    Query params:
+    - year: required, model year (e.g. 2020)
+    - make, model: optional keywords matched against the product name and its car variant
+    - category: optional product category
+    - in_stock: true to only return products with stock (default: false)
+    A product fits when year_from <= year <= year_to (open-ended ranges have no year_to).
+    """
+    year = request.args.get('year', type=int)
+    if not year:
+        return jsonify({"msg": "A numeric 'year' is required"}), 400
+
+    query = Product.query.outerjoin(CarVariant, CarVariant.id == Product.car_variant_id).filter(
+        Product.is_active == True,
+        Product.year_from <= year,
+        or_(Product.year_to >= year, Product.year_to.is_(None))
+    )
+
+    keywords = []
+    for param in ('make', 'model'):
+        keywords.extend((request.args.get(param) or '').split())
+    for keyword in keywords:
+        term = f"%{keyword}%"
+        query = query.filter(or_(
+            Product.name.ilike(term),
+            CarVariant.car_name.ilike(term),
+            CarVariant.name.ilike(term)
+        ))
+
+    category = request.args.get('category')
+    if category:
+        try:
+            query = query.filter(Product.category == ProductCategory[category.upper()])
+        except KeyError:
+            return jsonify({"msg": f"Invalid category: {category}"}), 400
+
+    if request.args.get('in_stock', 'false').lower() == 'true':
+        query = query.filter(Product.stock_quantity > 0)
+
+    # Narrowest ranges first: they are the most specific fit
+    products = query.order_by(
+        (func.coalesce(Product.year_to, year) - Product.year_from).asc(),
+        Product.name.asc()
+    ).all()
+
+    results = [{
+        'id': product.id,
+        'product_code': product.product_code,
+        'name': product.name,
+        'category': product.category.value if product.category else None,
+        'year': product.year,
+        'year_from': product.year_from,
+        'year_to': product.year_to,
+        'length_mm': product.length_mm,
+        'width_mm': product.width_mm,
+        'stock_quantity': product.stock_quantity,
+        'selling_price': product.selling_price
+    } for product in products]
+
+    return jsonify({
+        'success': True,
+        'data': results,
+        'count': len(results)
+    })
@@ -0,0 +1,218 @@
+"""
+Reports API routes for financial summaries (Abby only)
+"""
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy import event, func, inspect, literal, null, union_all
+from sqlalchemy.orm import Session
+from datetime import datetime, date, timedelta
+import time
+from models import db, Sale, SaleItem, Product, Expense, is_demo_request
+from routes.utils import require_financial_access
+from metrics import record_cache_lookup
+
+reports_bp = Blueprint('reports_bp', __name__)
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# Results for closed periods: {(granularity, start, end): (cached_at, period_data)}
+_closed_period_cache = {}
+
+def clear_report_cache():
+    """Drop cached report periods (called when sales or expenses change)"""
+    _closed_period_cache.clear()
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_report_cache(session, flush_context):
+    """Closed periods can still change through back-dated edits; drop the cache then"""
+    if not _closed_period_cache:
+        return
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Sale, SaleItem, Expense)):
+            clear_report_cache()
+            return
+        if isinstance(obj, Product) and inspect(obj).attrs.purchase_price.history.has_changes():
+            clear_report_cache()
+            return
+
+def period_start(d, granularity):
+    """First day of the period containing d (weeks start on Monday)"""
+    if granularity == 'month':
+        return d.replace(day=1)
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    return d
+
+def next_period_start(start, granularity):
+    """First day of the period after the one starting at start"""
+    if granularity == 'month':
+        return date(start.year + 1, 1, 1) if start.month == 12 else date(start.year, start.month + 1, 1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    return start + timedelta(days=1)
+
+def period_label_expr(column, granularity):
+    """SQL expression labelling a date/datetime column with its period start ('YYYY-MM-DD')"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.to_char(func.date_trunc(granularity, column), 'YYYY-MM-DD')
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', column)
+    if granularity == 'week':
+        return func.strftime('%Y-%m-%d', column, 'weekday 0', '-6 days')
+    return func.strftime('%Y-%m-%d', column)
+
+def _empty_period(start, end, closed):
+    return {
+        'period': start.isoformat(),
+        'start': start.isoformat(),
+        'end': (end - timedelta(days=1)).isoformat(),
+        'closed': closed,
+        'revenue': 0.0,
+        'discounts': 0.0,
+        'net_revenue': 0.0,
+        'cogs': 0.0,
+        'gross_margin': 0.0,
+        'expenses': {},
+        'operating_expenses': 0.0,
+        'stock_purchases': 0.0,
+        'net_profit': 0.0
+    }
+
+def _query_pnl_rows(start, end, granularity):
+    """Sales, COGS and expenses per period in a single UNION ALL round trip"""
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end, datetime.min.time())
+    sale_period = period_label_expr(Sale.sale_date, granularity)
+    expense_period = period_label_expr(Expense.date, granularity)
+
+    sales = db.session.query(
+        sale_period.label('period'),
+        literal('sales').label('kind'),
+        null().label('category'),
+        func.sum(Sale.total_amount + func.coalesce(Sale.discount_amount, 0)).label('amount'),
+        func.sum(func.coalesce(Sale.discount_amount, 0)).label('extra')
+    ).filter(Sale.sale_date >= start_dt, Sale.sale_date < end_dt).group_by(sale_period)
+
+    # Cost of goods sold at the product's current purchase price
+    cogs = db.session.query(
+        sale_period.label('period'),
+        literal('cogs').label('kind'),
+        null().label('category'),
+        func.sum(SaleItem.quantity * func.coalesce(Product.purchase_price, 0)).label('amount'),
+        literal(0).label('extra')
+    ).join(Sale, Sale.id == SaleItem.sale_id).join(Product, Product.id == SaleItem.product_id).filter(
+        Sale.sale_date >= start_dt, Sale.sale_date < end_dt
+    ).group_by(sale_period)
+
+    expenses = db.session.query(
+        expense_period.label('period'),
+        literal('expense').label('kind'),
+        Expense.category.label('category'),
+        func.sum(Expense.amount).label('amount'),
+        literal(0).label('extra')
+    ).filter(Expense.date >= start, Expense.date < end).group_by(expense_period, Expense.category)
+
+    statement = union_all(sales.statement, cogs.statement, expenses.statement)
+    return db.session.execute(statement).all()
+
+@reports_bp.route('/pnl', methods=['GET'])
+@require_financial_access
+def get_pnl():
+    """
+    Profit & loss per period
+    Query params:
+    - from, to: inclusive date range (YYYY-MM-DD, default: start of this year to today)
+    - granularity: day, week or month (default: month)
+    Gross margin is net revenue minus cost of goods sold (quantity x current
+    purchase price). Stock purchases are reported under expenses but left out
+    of net profit, since they are already counted as cost of goods sold.
+    Closed periods are cached in-process for PNL_CACHE_TTL seconds.
+    """
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return jsonify({"msg": f"Invalid granularity. Use one of: {', '.join(GRANULARITIES)}"}), 400
+
+    today = date.today()
+    try:
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else date(today.year, 1, 1)
+        last = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+    except ValueError:
+        return jsonify({"msg": "Invalid date format. Use YYYY-MM-DD"}), 400
+    if last < start:
+        return jsonify({"msg": "'to' must not be before 'from'"}), 400
+    end = last + timedelta(days=1)
+
+    # Split the range into periods, clipped to [start, end)
+    periods = []
+    cursor = period_start(start, granularity)
+    while cursor < end:
+        following = next_period_start(cursor, granularity)
+        periods.append((max(cursor, start), min(following, end)))
+        cursor = following
+
+    ttl = current_app.config.get('PNL_CACHE_TTL', 900)
+    now = time.time()
+    # Demo requests read another database and must not share the cache
+    cache = {} if is_demo_request() else _closed_period_cache
+    results = {}
+    for p_start, p_end in periods:
+        cached = cache.get((granularity, p_start, p_end))
+        if cached and now - cached[0] < ttl:
+            results[p_start] = cached[1]
+
+    # Query once, from the first period that is not cached
+    missing = [p for p in periods if p[0] not in results]
+    if cache is _closed_period_cache:
+        record_cache_lookup('pnl_periods', True, len(results))
+        record_cache_lookup('pnl_periods', False, len(missing))
+    if missing:
+        query_start = missing[0][0]
+        fresh = {
+            p_start: _empty_period(p_start, p_end, p_end <= today)
+            for p_start, p_end in periods if p_start >= query_start
+        }
+        for row in _query_pnl_rows(query_start, end, granularity):
+            # Rows are labelled by the unclipped period start
+            row_start = max(date.fromisoformat(row.period), query_start)
+            period = fresh.get(row_start)
+            if period is None:
+                continue
+            amount = float(row.amount or 0)
+            if row.kind == 'sales':
+                period['revenue'] = amount
+                period['discounts'] = float(row.extra or 0)
+            elif row.kind == 'cogs':
+                period['cogs'] = amount
+            else:
+                period['expenses'][row.category] = amount
+
+        for (p_start, p_end), period in ((p, fresh[p[0]]) for p in periods if p[0] in fresh):
+            period['net_revenue'] = period['revenue'] - period['discounts']
+            period['gross_margin'] = period['net_revenue'] - period['cogs']
+            period['stock_purchases'] = period['expenses'].get('stock_purchase', 0.0)
+            period['operating_expenses'] = sum(period['expenses'].values()) - period['stock_purchases']
+            period['net_profit'] = period['gross_margin'] - period['operating_expenses']
+            if period['closed']:
+                cache[(granularity, p_start, p_end)] = (now, period)
+            results[p_start] = period
+
+    ordered = [results[p_start] for p_start, _ in periods]
+    totals = {
+        key: sum(p[key] for p in ordered)
+        for key in ('revenue', 'discounts', 'net_revenue', 'cogs', 'gross_margin',
+                    'operating_expenses', 'stock_purchases', 'net_profit')
+    }
+    totals['expenses'] = {}
+    for p in ordered:
+        for category, amount in p['expenses'].items():
+            totals['expenses'][category] = totals['expenses'].get(category, 0.0) + amount
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'from': start.isoformat(),
+            'to': last.isoformat(),
+            'granularity': granularity,
+            'periods': ordered,
+            'totals': totals
+        }
+    })
@@ -5,11 +5,11 @@ Abby: Full access to all sales data and financial information
 Ivy: Can create sales but cannot view sales history or financial details
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt
+from flask_jwt_extended import get_jwt
 from sqlalchemy.orm import joinedload
 from datetime import datetime
 from models import db, Sale, SaleItem, Product, User, Payment, Customer
-from .utils import get_current_user, require_financial_access
+from .utils import jwt_required, get_current_user_id, require_financial_access
 
 sales_bp = Blueprint('sales_bp', __name__)
 
@@ -38,9 +38,9 @@ def create_sale():
     Sales can be created without prices (pending status) and prices added later
     """
     data = request.get_json()
-    user = get_current_user()
+    user_id = get_current_user_id()
     
-    if not user:
+    if not user_id:
         return jsonify({"msg": "User not found"}), 404
     
     # Validate required fields
@@ -110,7 +110,7 @@ def create_sale():
         total_amount=total_amount,
         discount_amount=discount_amount,
         amount_paid=float(data.get('amount_paid', 0.0) or 0.0),
-        created_by_user_id=user.id,
+        created_by_user_id=user_id,
         notes=data.get('notes')
     )
     
@@ -506,7 +506,7 @@ def add_payment(sale_id):
     """Add a payment to a sale"""
     sale = Sale.query.get_or_404(sale_id)
     data = request.get_json()
-    user = get_current_user()
+    user_id = get_current_user_id()
     
     try:
         amount = float(data.get('amount', 0))
@@ -525,7 +525,7 @@ def add_payment(sale_id):
         amount=amount,
         payment_method=data.get('payment_method', 'cash'),
         notes=data.get('notes'),
-        created_by_user_id=user.id
+        created_by_user_id=user_id
     )
     
     db.session.add(payment)
@@ -2,12 +2,11 @@
 Stock Intake API routes for tracking incoming stock purchases
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy import func
 from sqlalchemy.orm import joinedload
+from collections import defaultdict
 from datetime import datetime, date
-from models import db, StockIntake, StockIntakeItem, Product, User, Expense, Warehouse, ProductStock
-from routes.utils import get_current_user
+from models import db, StockIntake, StockIntakeItem, Product, Expense, Warehouse, ProductStock
+from routes.utils import jwt_required, get_current_user_id, apply_stock_deltas
 
 stock_intake_bp = Blueprint('stock_intake_bp', __name__)
 
@@ -36,9 +35,9 @@ def create_stock_intake():
     Create a new stock intake record and update inventory quantities
     """
     data = request.get_json()
-    user = get_current_user()
+    user_id = get_current_user_id()
     
-    if not user:
+    if not user_id:
         return jsonify({"msg": "User not found"}), 404
     
     # Validate required fields
@@ -103,7 +102,7 @@ def create_stock_intake():
         supplier_name=data['supplier_name'],
         notes=data.get('notes'),
         warehouse_id=warehouse_id,
-        created_by_user_id=user.id
+        created_by_user_id=user_id
     )
     
     db.session.add(stock_intake)
@@ -150,7 +149,7 @@ def create_stock_intake():
             amount=stock_intake.total_cost,
             description=f"Stock purchase from {stock_intake.supplier_name}",
             stock_intake_id=stock_intake.id,
-            created_by_user_id=user.id
+            created_by_user_id=user_id
         )
         db.session.add(expense)
         db.session.commit()
@@ -279,8 +278,14 @@ def update_stock_intake(intake_id):
     - Update quantities and prices of existing items
     - Delete items
     Can only update pending intakes
+    Items, products and the linked expense are loaded up front and stock
+    changes are applied as one batched update, so the query count does not
+    grow with the number of items edited.
     """
-    intake = StockIntake.query.get_or_404(intake_id)
+    intake = StockIntake.query.options(
+        joinedload(StockIntake.items),
+        joinedload(StockIntake.expense)
+    ).get_or_404(intake_id)
     
     data = request.get_json()
     
@@ -295,94 +300,81 @@ def update_stock_intake(intake_id):
         except ValueError:
             return jsonify({"msg": "Invalid date format. Use YYYY-MM-DD"}), 400
     
+    # Validate new items before touching anything
+    new_items = data.get('new_items', [])
+    for new_item_data in new_items:
+        if not new_item_data.get('product_id') or not new_item_data.get('quantity'):
+            return jsonify({"msg": "Each new item must have product_id and quantity"}), 400
+        quantity = new_item_data.get('quantity')
+        if not isinstance(quantity, int) or quantity < 1:
+            return jsonify({"msg": f"Invalid quantity {quantity}"}), 400
+    
+    # Load every product this edit can touch in one query
+    items_by_id = {item.id: item for item in intake.items}
+    product_ids = {item.product_id for item in intake.items}
+    product_ids.update(new_item_data['product_id'] for new_item_data in new_items)
+    products = Product.query.filter(Product.id.in_(product_ids)).all() if product_ids else []
+    product_map = {p.id: p for p in products}
+    
+    # Stock changes are accumulated here and written in one go at the end
+    product_deltas = defaultdict(int)
+    
     # Handle item deletions first
-    deleted_item_ids = data.get('deleted_item_ids', [])
-    if deleted_item_ids:
-        for item_id in deleted_item_ids:
-            item = StockIntakeItem.query.filter_by(
-                id=item_id,
-                stock_intake_id=intake.id
-            ).first()
-            
-            if item:
-                # Reverse the stock addition
-                product = Product.query.get(item.product_id)
-                if product:
-                    product.stock_quantity -= item.quantity
-                
-                db.session.delete(item)
+    for item_id in data.get('deleted_item_ids', []):
+        item = items_by_id.pop(item_id, None)
+        if item:
+            # Reverse the stock addition
+            product_deltas[item.product_id] -= item.quantity
+            intake.items.remove(item)  # delete-orphan cascade removes the row
     
     # Update existing items (quantities and prices)
     if 'items' in data and isinstance(data['items'], list):
         for item_data in data['items']:
-            item_id = item_data.get('id')
+            item = items_by_id.get(item_data.get('id'))
+            if not item:
+                continue
             
-            if item_id:
-                item = StockIntakeItem.query.filter_by(
-                    id=item_id,
-                    stock_intake_id=intake.id
-                ).first()
+            # Update quantity if provided
+            if 'quantity' in item_data:
+                new_quantity = int(item_data['quantity'])
+                if new_quantity < 1:
+                    return jsonify({"msg": f"Quantity must be at least 1"}), 400
                 
-                if item:
-                    # Update quantity if provided
-                    if 'quantity' in item_data:
-                        new_quantity = int(item_data['quantity'])
-                        if new_quantity < 1:
-                            return jsonify({"msg": f"Quantity must be at least 1"}), 400
-                        
-                        # Adjust stock based on quantity change
-                        quantity_diff = new_quantity - item.quantity
-                        if quantity_diff != 0:
-                            product = Product.query.get(item.product_id)
-                            if product:
-                                product.stock_quantity += quantity_diff
-                        
-                        item.quantity = new_quantity
-                    
-                    # Update price if provided
-                    if 'purchase_price_per_unit' in item_data:
-                        purchase_price = item_data.get('purchase_price_per_unit')
-                        item.purchase_price_per_unit = float(purchase_price) if purchase_price is not None else None
-                        
-                        # Optionally update product's default purchase price
-                        if purchase_price is not None and data.get('update_purchase_price', False):
-                            product = Product.query.get(item.product_id)
-                            if product:
-                                product.purchase_price = float(purchase_price)
+                # Adjust stock based on quantity change
+                product_deltas[item.product_id] += new_quantity - item.quantity
+                item.quantity = new_quantity
+            
+            # Update price if provided
+            if 'purchase_price_per_unit' in item_data:
+                purchase_price = item_data.get('purchase_price_per_unit')
+                item.purchase_price_per_unit = float(purchase_price) if purchase_price is not None else None
+                
+                # Optionally update product's default purchase price
+                if purchase_price is not None and data.get('update_purchase_price', False):
+                    product = product_map.get(item.product_id)
+                    if product:
+                        product.purchase_price = float(purchase_price)
     
     # Add new items
-    new_items = data.get('new_items', [])
-    if new_items:
-        for new_item_data in new_items:
-            product_id = new_item_data.get('product_id')
-            quantity = new_item_data.get('quantity')
-            purchase_price = new_item_data.get('purchase_price_per_unit')
-            
-            if not product_id or not quantity:
-                return jsonify({"msg": "Each new item must have product_id and quantity"}), 400
-            
-            # Validate product exists
-            product = Product.query.get(product_id)
-            if not product:
-                return jsonify({"msg": f"Product ID {product_id} not found"}), 404
-            
-            if not isinstance(quantity, int) or quantity < 1:
-                return jsonify({"msg": f"Invalid quantity {quantity}"}), 400
-            
-            # Create new intake item
-            new_item = StockIntakeItem(
-                stock_intake_id=intake.id,
-                product_id=product_id,
-                quantity=quantity,
-                purchase_price_per_unit=float(purchase_price) if purchase_price is not None else None
-            )
-            db.session.add(new_item)
-            
-            # Update product stock quantity
-            product.stock_quantity += quantity
+    for new_item_data in new_items:
+        product_id = new_item_data['product_id']
+        quantity = new_item_data['quantity']
+        purchase_price = new_item_data.get('purchase_price_per_unit')
+        
+        # Validate product exists
+        if product_id not in product_map:
+            return jsonify({"msg": f"Product ID {product_id} not found"}), 404
+        
+        intake.items.append(StockIntakeItem(
+            product_id=product_id,
+            quantity=quantity,
+            purchase_price_per_unit=float(purchase_price) if purchase_price is not None else None
+        ))
+        
+        # Update product stock quantity
+        product_deltas[product_id] += quantity
     
     # Validate that at least one item remains
-    db.session.flush()  # Flush to get updated items list
     if len(intake.items) == 0:
         db.session.rollback()
         return jsonify({"msg": "Stock intake must have at least one item"}), 400
@@ -395,18 +387,23 @@ def update_stock_intake(intake_id):
     # When transitioning from pending to completed, update product purchase prices
     if old_status == 'pending' and new_status == 'completed':
         for item in intake.items:
-            product = Product.query.get(item.product_id)
+            product = product_map.get(item.product_id)
             if product and item.purchase_price_per_unit is not None:
                 # Update product's purchase price with the latest intake item price
                 product.purchase_price = item.purchase_price_per_unit
     
-    db.session.commit()
+    # Apply stock changes to product totals and to the intake's warehouse
+    warehouse_deltas = {}
+    if intake.warehouse_id:
+        warehouse_deltas = {
+            (product_id, intake.warehouse_id): delta
+            for product_id, delta in product_deltas.items()
+        }
+    apply_stock_deltas(product_deltas, warehouse_deltas)
     
     # Manage expense based on status changes
+    existing_expense = intake.expense[0] if intake.expense else None
     if new_status == 'completed':
-        # Check if expense already exists for this intake
-        existing_expense = Expense.query.filter_by(stock_intake_id=intake.id).first()
-        
         if existing_expense:
             # Update existing expense
             existing_expense.date = intake.intake_date
@@ -414,20 +411,17 @@ def update_stock_intake(intake_id):
             existing_expense.description = f"Stock purchase from {intake.supplier_name}"
         else:
             # Create new expense (intake just became completed)
-            username = get_jwt_identity()
-            user = User.query.filter_by(username=username).first()
             expense = Expense(
                 date=intake.intake_date,
                 category='stock_purchase',
                 amount=intake.total_cost,
                 description=f"Stock purchase from {intake.supplier_name}",
                 stock_intake_id=intake.id,
-                created_by_user_id=user.id
+                created_by_user_id=get_current_user_id()
             )
             db.session.add(expense)
     elif old_status == 'completed' and new_status == 'pending':
         # Intake went from completed to pending - delete expense
-        existing_expense = Expense.query.filter_by(stock_intake_id=intake.id).first()
         if existing_expense:
             db.session.delete(existing_expense)
     
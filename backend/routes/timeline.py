@@ -0,0 +1,304 @@
+"""
+Timeline API routes and automatic activity capture
+Domain writes are collected from every session flush and written to
+timeline_event in one multi-row insert when the transaction commits.
+Product changes are only described at commit, once it is known which
+products a sale or intake moved.
+"""
+from flask import Blueprint, request, jsonify, has_request_context
+from sqlalchemy import and_, event, insert, inspect
+from sqlalchemy.orm import Session, joinedload
+from datetime import datetime, timedelta
+from models import (
+    Product, CarVariant, Customer, Sale, SaleItem, Payment,
+    StockIntake, StockIntakeItem, StockTransfer, Expense, Warehouse, TimelineEvent
+)
+from routes.utils import jwt_required, get_current_user_id
+from metrics import COMMITTED_EVENTS_KEY
+
+timeline_bp = Blueprint('timeline_bp', __name__)
+
+PENDING_KEY = 'timeline_pending'
+DESCRIPTION_LENGTH = 255
+
+# Product columns whose changes are not worth an event (derived or moved by other events)
+PRODUCT_QUIET_FIELDS = {'stock_quantity', 'updated_at', 'year_from', 'year_to'}
+# Product columns a sale or intake sets as part of the document (intakes update the purchase price)
+PRODUCT_DOCUMENT_FIELDS = {'purchase_price'}
+
+# Product changes are collected over the whole transaction and described at commit:
+# a document's item rows may be flushed after the stock they move (e.g. when
+# deleting a sale lazy-loads its items, the autoflush writes the stock first)
+PRODUCT_CHANGES_KEY = 'timeline_product_changes'
+DOCUMENT_PRODUCTS_KEY = 'timeline_document_products'
+
+# ============== CAPTURE ==============
+
+def _loaded(session, model, pk):
+    """Object already in the session, without emitting a query"""
+    if pk is None:
+        return None
+    return session.identity_map.get(inspect(model).identity_key_from_primary_key((pk,)))
+
+def _product_label(session, product_id):
+    product = _loaded(session, Product, product_id)
+    return f"'{product.name}'" if product else f"product #{product_id}"
+
+def _warehouse_label(session, warehouse_id):
+    warehouse = _loaded(session, Warehouse, warehouse_id)
+    return warehouse.name if warehouse else f"warehouse #{warehouse_id}"
+
+def _changed_fields(obj, quiet=()):
+    """Column attributes modified on obj in this flush"""
+    state = inspect(obj)
+    return [
+        attr.key for attr in state.mapper.column_attrs
+        if attr.key not in quiet and state.attrs[attr.key].history.has_changes()
+    ]
+
+def _describe_new(session, obj):
+    if isinstance(obj, Sale):
+        return 'SALE_CREATE', f"Sale {obj.invoice_number} to '{obj.customer_name}' for ₹{obj.total_amount:,.2f}."
+    if isinstance(obj, Payment):
+        return 'PAYMENT_ADD', f"Payment of ₹{obj.amount:,.2f} ({obj.payment_method}) recorded for sale #{obj.sale_id}."
+    if isinstance(obj, StockIntake):
+        return 'STOCK_INTAKE', f"Stock intake #{obj.id} from '{obj.supplier_name}' recorded."
+    if isinstance(obj, StockTransfer):
+        return 'STOCK_TRANSFER', (
+            f"{obj.quantity} x {_product_label(session, obj.product_id)} moved from "
+            f"{_warehouse_label(session, obj.from_warehouse_id)} to {_warehouse_label(session, obj.to_warehouse_id)}."
+        )
+    if isinstance(obj, Expense):
+        # Expenses created by a stock intake are covered by the intake event
+        if obj.stock_intake_id:
+            return None
+        return 'EXPENSE_ADD', f"Expense of ₹{obj.amount:,.2f} ({obj.category}) recorded."
+    if isinstance(obj, Customer):
+        return 'CUSTOMER_ADD', f"Customer '{obj.name}' added."
+    if isinstance(obj, CarVariant):
+        return 'PRODUCT_ADD', f"New sunroof '{obj.name}' for '{obj.car_name}' added to catalog."
+    if isinstance(obj, Product):
+        return 'PRODUCT_ADD', f"Product {obj.product_code} '{obj.name}' added."
+    return None
+
+def _describe_deleted(session, obj):
+    if isinstance(obj, Sale):
+        return 'SALE_DELETE', f"Sale {obj.invoice_number} for '{obj.customer_name}' deleted."
+    if isinstance(obj, StockIntake):
+        return 'STOCK_INTAKE_DELETE', f"Stock intake #{obj.id} from '{obj.supplier_name}' deleted."
+    if isinstance(obj, Expense):
+        if obj.stock_intake_id:
+            return None
+        return 'EXPENSE_DELETE', f"Expense of ₹{obj.amount:,.2f} ({obj.category}) deleted."
+    if isinstance(obj, Customer):
+        return 'CUSTOMER_DELETE', f"Customer '{obj.name}' deleted."
+    if isinstance(obj, CarVariant):
+        return 'PRODUCT_DELETE', f"Sunroof '{obj.name}' for '{obj.car_name}' deleted from catalog."
+    if isinstance(obj, Product):
+        return 'PRODUCT_DELETE', f"Product {obj.product_code} '{obj.name}' deleted."
+    return None
+
+def _describe_dirty(session, obj):
+    if isinstance(obj, Sale):
+        changed = _changed_fields(obj)
+        if 'total_amount' in changed or 'discount_amount' in changed:
+            return 'SALE_UPDATE', f"Sale {obj.invoice_number} updated: total ₹{obj.total_amount:,.2f}."
+        return None
+    if isinstance(obj, StockIntake):
+        if not session.is_modified(obj):
+            return None
+        return 'STOCK_INTAKE_UPDATE', f"Stock intake #{obj.id} from '{obj.supplier_name}' updated."
+    if isinstance(obj, Expense):
+        if obj.stock_intake_id or not _changed_fields(obj):
+            return None
+        return 'EXPENSE_UPDATE', f"Expense #{obj.id} ({obj.category}) updated."
+    if isinstance(obj, CarVariant):
+        changed = _changed_fields(obj)
+        if not changed:
+            return None
+        return 'PRODUCT_UPDATE', f"Details for '{obj.name}' updated: {', '.join(changed)}."
+    return None
+
+def _record_product_change(session, product):
+    """Merge this flush's changes to product into the transaction's pending product changes"""
+    changed = _changed_fields(product, PRODUCT_QUIET_FIELDS)
+    stock = inspect(product).attrs.stock_quantity.history
+    if not changed and not stock.has_changes():
+        return
+    entry = session.info.setdefault(PRODUCT_CHANGES_KEY, {}).setdefault(product.id, {'fields': []})
+    entry['label'] = f"{product.product_code} '{product.name}'"
+    entry['fields'] += [field for field in changed if field not in entry['fields']]
+    if 'is_active' in changed:
+        entry['deactivated'] = not product.is_active
+    if stock.has_changes():
+        # Keep the value from before the first change in this transaction
+        entry.setdefault('stock_from', stock.deleted[0] if stock.deleted else None)
+        entry['stock_to'] = product.stock_quantity
+
+def _describe_product_changes(session):
+    """Queue the transaction's product events, leaving out what sales and intakes did"""
+    changes = session.info.pop(PRODUCT_CHANGES_KEY, {})
+    documents = session.info.pop(DOCUMENT_PRODUCTS_KEY, set())
+    for product_id, entry in changes.items():
+        moved_by_document = product_id in documents
+        fields = [f for f in entry['fields'] if not (moved_by_document and f in PRODUCT_DOCUMENT_FIELDS)]
+        label = entry['label']
+        if entry.get('deactivated'):
+            _queue(session, 'PRODUCT_DEACTIVATE', f"Product {label} deactivated.")
+        elif fields:
+            _queue(session, 'PRODUCT_UPDATE', f"Details for {label} updated: {', '.join(fields)}.")
+        elif 'stock_to' in entry and not moved_by_document and entry['stock_from'] != entry['stock_to']:
+            _queue(session, 'STOCK_ADJUST', f"Stock for {label} adjusted from {entry['stock_from']} to {entry['stock_to']}.")
+
+def _queue(session, event_type, description, user_id=None):
+    session.info.setdefault(PENDING_KEY, []).append({
+        'event_type': event_type,
+        'description': description[:DESCRIPTION_LENGTH],
+        'user_id': user_id
+    })
+
+@event.listens_for(Session, 'after_flush')
+def _capture_timeline(session, flush_context):
+    """Queue one event per domain change in this flush"""
+    new = list(session.new)
+    deleted = list(session.deleted)
+    dirty = list(session.dirty)
+
+    # A product saved together with its catalog variant is reported once, as the variant
+    variant_ids = {obj.id for obj in new + deleted + dirty if isinstance(obj, CarVariant)}
+    # Stock moved by a sale or intake is part of that document, not a manual adjustment
+    session.info.setdefault(DOCUMENT_PRODUCTS_KEY, set()).update(
+        obj.product_id for obj in new + deleted + dirty if isinstance(obj, (SaleItem, StockIntakeItem))
+    )
+
+    for objects, describe in ((new, _describe_new), (deleted, _describe_deleted)):
+        for obj in objects:
+            if isinstance(obj, Product) and obj.car_variant_id in variant_ids:
+                continue
+            described = describe(session, obj)
+            if described:
+                _queue(session, *described, user_id=getattr(obj, 'created_by_user_id', None))
+    for obj in dirty:
+        if isinstance(obj, Product):
+            if obj.car_variant_id not in variant_ids:
+                _record_product_change(session, obj)
+            continue
+        described = _describe_dirty(session, obj)
+        if described:
+            _queue(session, *described, user_id=getattr(obj, 'created_by_user_id', None))
+
+@event.listens_for(Session, 'do_orm_execute')
+def _capture_bulk_transfers(orm_execute_state):
+    """Bulk transfers are inserted with executemany and never pass through the flush"""
+    if not orm_execute_state.is_insert or orm_execute_state.bind_mapper is not inspect(StockTransfer):
+        return
+    rows = orm_execute_state.parameters
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        return
+    session = orm_execute_state.session
+    units = sum(row.get('quantity', 0) for row in rows)
+    if len(rows) == 1:
+        row = rows[0]
+        description = (
+            f"{row['quantity']} x {_product_label(session, row['product_id'])} moved from "
+            f"{_warehouse_label(session, row['from_warehouse_id'])} to {_warehouse_label(session, row['to_warehouse_id'])}."
+        )
+    else:
+        description = f"Bulk transfer of {units} units across {len(rows)} lines (batch {rows[0].get('batch_id')})."
+    _queue(session, 'STOCK_TRANSFER', description, user_id=rows[0].get('created_by_user_id'))
+
+def _request_user_id():
+    """Id of the logged-in user from the token claims, if there is one"""
+    if not has_request_context():
+        return None
+    try:
+        return get_current_user_id()
+    except Exception:
+        return None
+
+@event.listens_for(Session, 'before_commit')
+def _write_timeline(session):
+    """Write the queued events in one multi-row INSERT inside the committing transaction"""
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    _describe_product_changes(session)
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    if any(row['user_id'] is None for row in pending):
+        user_id = _request_user_id()
+        for row in pending:
+            if row['user_id'] is None:
+                row['user_id'] = user_id
+    session.execute(insert(TimelineEvent).values(pending))
+    # Counted by the business metrics once the commit succeeds
+    session.info.setdefault(COMMITTED_EVENTS_KEY, []).extend(row['event_type'] for row in pending)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_timeline(session):
+    for key in (PENDING_KEY, PRODUCT_CHANGES_KEY, DOCUMENT_PRODUCTS_KEY):
+        session.info.pop(key, None)
+
+# ============== TIMELINE ENDPOINT ==============
+
+@timeline_bp.route('', methods=['GET'])
+@jwt_required()
+def get_timeline():
+    """
+    Activity timeline, newest first, using keyset pagination
+    Query params:
+    - event_type: one type or a comma-separated list (e.g. SALE_CREATE,PAYMENT_ADD)
+    - user_id: only events by this user
+    - start_date, end_date: filter by date range (YYYY-MM-DD, inclusive)
+    - limit: page size (default 50, max 200)
+    - cursor: 'next_cursor' value from the previous page
+    """
+    filters = []
+
+    if request.args.get('event_type'):
+        types = [t.strip().upper() for t in request.args['event_type'].split(',') if t.strip()]
+        filters.append(TimelineEvent.event_type.in_(types))
+
+    if request.args.get('user_id'):
+        filters.append(TimelineEvent.user_id == request.args.get('user_id', type=int))
+
+    try:
+        if request.args.get('start_date'):
+            filters.append(TimelineEvent.timestamp >= datetime.strptime(request.args['start_date'], '%Y-%m-%d'))
+        if request.args.get('end_date'):
+            end = datetime.strptime(request.args['end_date'], '%Y-%m-%d') + timedelta(days=1)
+            filters.append(TimelineEvent.timestamp < end)
+    except ValueError:
+        return jsonify({"msg": "Invalid date format. Use YYYY-MM-DD"}), 400
+
+    # Ids increase with insertion order, so the cursor is simply the last id seen
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            filters.append(TimelineEvent.id < int(cursor))
+        except ValueError:
+            return jsonify({"msg": "Invalid cursor"}), 400
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    events = TimelineEvent.query.options(joinedload(TimelineEvent.user)).filter(
+        and_(*filters)
+    ).order_by(TimelineEvent.id.desc()).limit(limit + 1).all()
+
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    return jsonify({
+        'success': True,
+        'data': [{
+            'id': e.id,
+            'event_type': e.event_type,
+            'description': e.description,
+            'timestamp': e.timestamp.isoformat() if e.timestamp else None,
+            'user_id': e.user_id,
+            'user_name': e.user.full_name if e.user else None
+        } for e in events],
+        'count': len(events),
+        'next_cursor': str(events[-1].id) if has_more else None
+    })
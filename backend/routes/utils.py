@@ -1,20 +1,193 @@
-from flask import jsonify
-from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
-from models import User
+from flask import jsonify, current_app, g
+from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
+from functools import wraps
+from sqlalchemy import case, event, func, inspect, update
+from sqlalchemy.orm import Session
+from collections import namedtuple
+import time
+from models import db, User, Product, ProductStock, is_demo_request
+from metrics import record_cache_lookup
+
+def verify_request_jwt():
+    """
+    Decode and verify the request's JWT once per request.
+    The outcome is kept on g: jwt_identity and jwt_claims (None / {} without a
+    valid token) and jwt_error (the verification exception, if any). The demo
+    interceptor and the route decorators all read it from there.
+    """
+    if 'jwt_claims' in g:
+        return g.jwt_claims
+    g.jwt_identity = None
+    g.jwt_claims = {}
+    g.jwt_error = None
+    try:
+        # Returns None for methods exempt from JWT checks (e.g. OPTIONS)
+        if verify_jwt_in_request() is not None:
+            g.jwt_identity = get_jwt_identity()
+            g.jwt_claims = get_jwt()
+    except Exception as e:
+        g.jwt_error = e
+    return g.jwt_claims
+
+def jwt_required():
+    """Drop-in for flask_jwt_extended's jwt_required() that reuses verify_request_jwt()"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            verify_request_jwt()
+            if g.jwt_error is not None:
+                # Handled by JWTManager's error handlers, as before
+                raise g.jwt_error
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
 
 def require_financial_access(fn):
     """Decorator to check if user has financial access (Abby only)"""
     @jwt_required()
     def wrapper(*args, **kwargs):
-        claims = get_jwt()
-        can_view_financials = claims.get('can_view_financials', False)
-        if not can_view_financials:
+        if not g.jwt_claims.get('can_view_financials', False):
             return jsonify({"msg": "Financial data access denied"}), 403
         return fn(*args, **kwargs)
     wrapper.__name__ = fn.__name__
     return wrapper
 
+def require_admin(fn):
+    """Decorator for admin-only endpoints (Abby only)"""
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user = get_current_user()
+        if not user or user.username != 'abby':
+            return jsonify({"msg": "Admin access required"}), 403
+        return fn(*args, **kwargs)
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+# Read-only copy of a User row, safe to share between requests and threads
+CurrentUser = namedtuple('CurrentUser', ['id', 'username', 'full_name', 'can_view_financials'])
+
+# {username: (cached_at, CurrentUser)}
+_user_cache = {}
+
+# Changing any of these must not be served from a stale cache entry
+USER_CACHE_FIELDS = ('username', 'password_hash', 'full_name', 'can_view_financials')
+
+def clear_user_cache(username=None):
+    """Forget one cached user, or all of them"""
+    if username is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(username, None)
+
+@event.listens_for(Session, 'after_flush')
+def _invalidate_user_cache(session, flush_context):
+    """Password, name or permission changes drop the user from the cache"""
+    if not _user_cache:
+        return
+    for obj in list(session.dirty) + list(session.deleted):
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        if obj not in session.deleted and not any(attrs[f].history.has_changes() for f in USER_CACHE_FIELDS):
+            continue
+        # Old and new username, in case it was renamed
+        for username in attrs.username.history.sum():
+            clear_user_cache(username)
+
+def get_user_by_username(username):
+    """CurrentUser for username, cached in-process for USER_CACHE_TTL seconds"""
+    if not username:
+        return None
+    # Demo requests read the demo database, whose users are not cached
+    cache = {} if is_demo_request() else _user_cache
+    ttl = current_app.config.get('USER_CACHE_TTL', 60)
+    cached = cache.get(username)
+    hit = bool(cached) and time.time() - cached[0] < ttl
+    if cache is _user_cache:
+        record_cache_lookup('users', hit)
+    if hit:
+        return cached[1]
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        return None
+    snapshot = CurrentUser(user.id, user.username, user.full_name, user.can_view_financials)
+    cache[username] = (time.time(), snapshot)
+    return snapshot
+
 def get_current_user():
-    """Get the current logged-in user from JWT"""
-    username = get_jwt_identity()
-    return User.query.filter_by(username=username).first()
+    """Get the current logged-in user from JWT (cached, see get_user_by_username)"""
+    verify_request_jwt()
+    return get_user_by_username(g.jwt_identity)
+
+def get_current_user_id():
+    """Id of the logged-in user from the token claims, without touching the database"""
+    user_id = verify_request_jwt().get('user_id')
+    if user_id is not None:
+        return user_id
+    # Tokens issued before user_id was added to the claims
+    user = get_current_user()
+    return user.id if user else None
+
+def apply_stock_deltas(product_deltas=None, warehouse_deltas=None):
+    """
+    Apply stock changes computed in memory as batched statements.
+    - product_deltas: {product_id: delta} applied to Product.stock_quantity
+    - warehouse_deltas: {(product_id, warehouse_id): delta} upserted into ProductStock
+    Costs one UPDATE for products and one upsert for warehouse stock,
+    regardless of how many products are involved.
+    """
+    product_deltas = {pid: d for pid, d in (product_deltas or {}).items() if d}
+    warehouse_deltas = {key: d for key, d in (warehouse_deltas or {}).items() if d}
+
+    if product_deltas:
+        db.session.execute(
+            update(Product)
+            .where(Product.id.in_(list(product_deltas)))
+            .values(stock_quantity=Product.stock_quantity + case(product_deltas, value=Product.id, else_=0))
+            .execution_options(synchronize_session='fetch')
+        )
+
+    if not warehouse_deltas:
+        return
+
+    rows = [
+        {'product_id': pid, 'warehouse_id': wid, 'quantity': delta}
+        for (pid, wid), delta in sorted(warehouse_deltas.items())
+    ]
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(ProductStock).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['product_id', 'warehouse_id'],
+            set_={
+                'quantity': ProductStock.quantity + stmt.excluded.quantity,
+                'updated_at': func.now()
+            }
+        )
+        db.session.execute(stmt)
+        # Loaded ProductStock rows no longer reflect the database
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, ProductStock):
+                db.session.expire(obj, ['quantity', 'updated_at'])
+    else:
+        # Generic fallback: one SELECT for existing rows, then batched update/insert
+        product_ids = {r['product_id'] for r in rows}
+        warehouse_ids = {r['warehouse_id'] for r in rows}
+        existing = {
+            (s.product_id, s.warehouse_id): s
+            for s in ProductStock.query.filter(
+                ProductStock.product_id.in_(product_ids),
+                ProductStock.warehouse_id.in_(warehouse_ids)
+            ).all()
+        }
+        for r in rows:
+            stock = existing.get((r['product_id'], r['warehouse_id']))
+            if stock:
+                stock.quantity += r['quantity']
+            else:
+                db.session.add(ProductStock(**r))
+        db.session.flush()
@@ -2,15 +2,22 @@
 Warehouse and Stock Transfer API routes for multi-location inventory management
 """
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
-from datetime import datetime
-from models import db, Warehouse, ProductStock, StockTransfer, Product, User
-from routes.utils import get_current_user
+from sqlalchemy import String, and_, case, cast, func, insert, or_, tuple_
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+import json
+import math
+import uuid
+from models import db, Warehouse, ProductStock, StockTransfer, Product, ProductCategory, Sale, SaleItem, User
+from routes.utils import jwt_required, get_current_user, get_current_user_id, apply_stock_deltas
 
 warehouses_bp = Blueprint('warehouses_bp', __name__)
 
+def _escape_like(text):
+    """Escape LIKE wildcards for a pattern used with escape='!'"""
+    return text.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
 # ============== WAREHOUSE ENDPOINTS ==============
 
 @warehouses_bp.route('', methods=['GET'])
@@ -31,6 +38,87 @@ def get_warehouses():
         } for w in warehouses]
     })
 
+@warehouses_bp.route('/stock-matrix', methods=['GET'])
+@jwt_required()
+def get_stock_matrix():
+    """
+    Stock of every active product at every active warehouse, in one request
+    Query params:
+    - category: sunroof, windshield, door_glass, rear_glass, quarter_glass
+    - tag: only products carrying this tag
+    - search: search in name and product_code
+    Response is columnar: each key under 'products' and 'quantities' is a list
+    aligned by index, with one quantities list per warehouse code.
+    """
+    warehouses = Warehouse.query.filter_by(is_active=True).order_by(Warehouse.id).all()
+    
+    # One grouped query with a conditional SUM per warehouse column
+    warehouse_columns = [
+        func.coalesce(func.sum(case(
+            (ProductStock.warehouse_id == w.id, ProductStock.quantity), else_=0
+        )), 0).label(f'w_{w.id}')
+        for w in warehouses
+    ]
+    query = db.session.query(
+        Product.id,
+        Product.product_code,
+        Product.name,
+        Product.category,
+        Product.stock_quantity,
+        *warehouse_columns
+    ).outerjoin(ProductStock, ProductStock.product_id == Product.id).filter(Product.is_active == True)
+    
+    category = request.args.get('category')
+    if category:
+        try:
+            query = query.filter(Product.category == ProductCategory[category.upper()])
+        except KeyError:
+            return jsonify({"msg": f"Invalid category: {category}"}), 400
+    
+    tag = request.args.get('tag')
+    if tag:
+        # Tags are stored as a JSON list, or (older rows) a JSON string holding one;
+        # match the whole quoted element in either encoding, not a substring
+        element = json.dumps(tag)
+        tags_text = cast(Product.tags, String)
+        query = query.filter(or_(
+            tags_text.ilike(f'%{_escape_like(element)}%', escape='!'),
+            tags_text.ilike(f'%{_escape_like(json.dumps(element)[1:-1])}%', escape='!')
+        ))
+    
+    search = request.args.get('search')
+    if search:
+        search_term = f"%{search}%"
+        query = query.filter(or_(
+            Product.name.ilike(search_term),
+            Product.product_code.ilike(search_term)
+        ))
+    
+    rows = query.group_by(Product.id).order_by(Product.name).all()
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'warehouses': [{
+                'id': w.id,
+                'code': w.code,
+                'name': w.name
+            } for w in warehouses],
+            'products': {
+                'id': [r.id for r in rows],
+                'product_code': [r.product_code for r in rows],
+                'name': [r.name for r in rows],
+                'category': [r.category.value if r.category else None for r in rows],
+                'total_stock': [r.stock_quantity for r in rows]
+            },
+            'quantities': {
+                w.code: [int(r[5 + i]) for r in rows]
+                for i, w in enumerate(warehouses)
+            }
+        },
+        'count': len(rows)
+    })
+
 @warehouses_bp.route('/<int:warehouse_id>/stock', methods=['GET'])
 @jwt_required()
 def get_warehouse_stock(warehouse_id):
@@ -69,9 +157,9 @@ def create_transfer():
     Create a stock transfer between warehouses
     """
     data = request.get_json()
-    user = get_current_user()
+    user_id = get_current_user_id()
     
-    if not user:
+    if not user_id:
         return jsonify({"msg": "User not found"}), 404
     
     # Validate required fields
@@ -143,7 +231,7 @@ def create_transfer():
         to_warehouse_id=to_warehouse_id,
         quantity=quantity,
         notes=data.get('notes'),
-        created_by_user_id=user.id
+        created_by_user_id=user_id
     )
     db.session.add(transfer)
     
@@ -163,48 +251,213 @@ def create_transfer():
         }
     }), 201
 
+@warehouses_bp.route('/transfers/bulk', methods=['POST'])
+@jwt_required()
+def create_bulk_transfer():
+    """
+    Move several products between warehouses in one atomic request
+    Body:
+    - from_warehouse_id, to_warehouse_id: default route for every line
+    - lines: [{product_id, quantity, from_warehouse_id?, to_warehouse_id?}]
+    - notes: optional, stored on every line
+    All lines share one batch_id. Either every line is applied or none is.
+    """
+    return _execute_transfer_batch(request.get_json() or {})
+
+def _execute_transfer_batch(data, default_notes=None):
+    """Validate, lock and apply a multi-line transfer body; returns the response"""
+    user_id = get_current_user_id()
+    
+    if not user_id:
+        return jsonify({"msg": "User not found"}), 404
+    
+    lines = data.get('lines') if isinstance(data, dict) else None
+    if not lines or not isinstance(lines, list):
+        return jsonify({"msg": "At least one line is required"}), 400
+    
+    # Normalize and validate lines
+    parsed_lines = []
+    for index, line in enumerate(lines):
+        if not isinstance(line, dict):
+            return jsonify({"msg": f"Line {index} must be an object"}), 400
+        product_id = line.get('product_id')
+        from_warehouse_id = line.get('from_warehouse_id') or data.get('from_warehouse_id')
+        to_warehouse_id = line.get('to_warehouse_id') or data.get('to_warehouse_id')
+        if not product_id or not from_warehouse_id or not to_warehouse_id:
+            return jsonify({"msg": f"Line {index} needs product_id, from_warehouse_id and to_warehouse_id"}), 400
+        try:
+            product_id = int(product_id)
+            from_warehouse_id = int(from_warehouse_id)
+            to_warehouse_id = int(to_warehouse_id)
+        except (TypeError, ValueError):
+            return jsonify({"msg": f"Line {index} has an invalid product or warehouse id"}), 400
+        try:
+            quantity = int(line.get('quantity'))
+        except (TypeError, ValueError):
+            return jsonify({"msg": f"Invalid quantity on line {index} (product {product_id})"}), 400
+        if quantity < 1:
+            return jsonify({"msg": f"Quantity must be at least 1 (line {index})"}), 400
+        if from_warehouse_id == to_warehouse_id:
+            return jsonify({"msg": f"Cannot transfer to the same warehouse (line {index})"}), 400
+        parsed_lines.append((product_id, from_warehouse_id, to_warehouse_id, quantity))
+    
+    # Validate products and warehouses with one query each
+    product_ids = {l[0] for l in parsed_lines}
+    warehouse_ids = {l[1] for l in parsed_lines} | {l[2] for l in parsed_lines}
+    product_map = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids)).all()}
+    warehouse_map = {w.id: w for w in Warehouse.query.filter(Warehouse.id.in_(warehouse_ids)).all()}
+    
+    missing_products = product_ids - set(product_map)
+    if missing_products:
+        return jsonify({"msg": f"Product ID {min(missing_products)} not found"}), 404
+    if warehouse_ids - set(warehouse_map):
+        return jsonify({"msg": "Invalid warehouse"}), 404
+    
+    # Total requested per source row (the same product may appear on several lines)
+    requested = defaultdict(int)
+    warehouse_deltas = defaultdict(int)
+    for product_id, from_warehouse_id, to_warehouse_id, quantity in parsed_lines:
+        requested[(product_id, from_warehouse_id)] += quantity
+        warehouse_deltas[(product_id, from_warehouse_id)] -= quantity
+        warehouse_deltas[(product_id, to_warehouse_id)] += quantity
+    
+    # Lock all source rows in a deterministic order (avoids deadlocks between
+    # concurrent batches) and check availability in the same query
+    source_keys = sorted(requested)
+    source_stocks = ProductStock.query.filter(
+        tuple_(ProductStock.product_id, ProductStock.warehouse_id).in_(source_keys)
+    ).order_by(ProductStock.product_id, ProductStock.warehouse_id).with_for_update().all()
+    available = {(s.product_id, s.warehouse_id): s.quantity for s in source_stocks}
+    
+    shortages = []
+    for key in source_keys:
+        if available.get(key, 0) < requested[key]:
+            product_id, from_warehouse_id = key
+            shortages.append({
+                'product_id': product_id,
+                'product_name': product_map[product_id].name,
+                'warehouse': warehouse_map[from_warehouse_id].name,
+                'available': available.get(key, 0),
+                'requested': requested[key]
+            })
+    if shortages:
+        db.session.rollback()
+        return jsonify({
+            "msg": f"Insufficient stock for {len(shortages)} line(s)",
+            "shortages": shortages
+        }), 400
+    
+    # Build the response now; committing expires the loaded rows
+    batch_id = uuid.uuid4().hex
+    response_lines = [{
+        'product_id': product_id,
+        'product_name': product_map[product_id].name,
+        'from_warehouse': warehouse_map[from_warehouse_id].name,
+        'to_warehouse': warehouse_map[to_warehouse_id].name,
+        'quantity': quantity
+    } for product_id, from_warehouse_id, to_warehouse_id, quantity in parsed_lines]
+    
+    # Apply all decrements and increments, then record the lines
+    notes = data.get('notes') or default_notes
+    try:
+        apply_stock_deltas(warehouse_deltas=warehouse_deltas)
+        db.session.execute(insert(StockTransfer), [{
+            'product_id': product_id,
+            'from_warehouse_id': from_warehouse_id,
+            'to_warehouse_id': to_warehouse_id,
+            'quantity': quantity,
+            'notes': notes,
+            'batch_id': batch_id,
+            'created_by_user_id': user_id
+        } for product_id, from_warehouse_id, to_warehouse_id, quantity in parsed_lines])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"msg": f"Transfer failed: {str(e)}"}), 500
+    
+    return jsonify({
+        'success': True,
+        'msg': f'Transferred {sum(l[3] for l in parsed_lines)} units across {len(parsed_lines)} line(s)',
+        'data': {
+            'batch_id': batch_id,
+            'lines': response_lines
+        }
+    }), 201
+
 @warehouses_bp.route('/transfers', methods=['GET'])
 @jwt_required()
 def get_transfers():
     """
-    Get stock transfer history
+    Get stock transfer history, newest first, using keyset pagination
     Query params:
     - product_id: filter by product
     - from_warehouse_id, to_warehouse_id: filter by warehouse
     - start_date, end_date: filter by date range (YYYY-MM-DD)
+    - limit: page size (default 50, max 200)
+    - cursor: 'next_cursor' value from the previous page
+    - summary=day: per-product per-day totals instead of individual transfers
     """
-    query = StockTransfer.query.options(
-        joinedload(StockTransfer.product),
-        joinedload(StockTransfer.from_warehouse),
-        joinedload(StockTransfer.to_warehouse),
-        joinedload(StockTransfer.created_by)
-    )
+    filters = []
     
-    # Filters
     if request.args.get('product_id'):
-        query = query.filter(StockTransfer.product_id == int(request.args['product_id']))
+        filters.append(StockTransfer.product_id == int(request.args['product_id']))
     
     if request.args.get('from_warehouse_id'):
-        query = query.filter(StockTransfer.from_warehouse_id == int(request.args['from_warehouse_id']))
+        filters.append(StockTransfer.from_warehouse_id == int(request.args['from_warehouse_id']))
     
     if request.args.get('to_warehouse_id'):
-        query = query.filter(StockTransfer.to_warehouse_id == int(request.args['to_warehouse_id']))
+        filters.append(StockTransfer.to_warehouse_id == int(request.args['to_warehouse_id']))
     
     if request.args.get('start_date'):
         try:
             start = datetime.strptime(request.args['start_date'], '%Y-%m-%d')
-            query = query.filter(StockTransfer.transfer_date >= start)
+            filters.append(StockTransfer.transfer_date >= start)
         except ValueError:
             return jsonify({"msg": "Invalid start_date format. Use YYYY-MM-DD"}), 400
     
     if request.args.get('end_date'):
         try:
             end = datetime.strptime(request.args['end_date'], '%Y-%m-%d')
-            query = query.filter(StockTransfer.transfer_date <= end)
+            filters.append(StockTransfer.transfer_date <= end)
         except ValueError:
             return jsonify({"msg": "Invalid end_date format. Use YYYY-MM-DD"}), 400
     
-    transfers = query.order_by(StockTransfer.transfer_date.desc()).all()
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    cursor = request.args.get('cursor')
+    
+    if request.args.get('summary') == 'day':
+        return _get_transfer_day_summary(filters, limit, cursor)
+    
+    query = StockTransfer.query.options(
+        joinedload(StockTransfer.product),
+        joinedload(StockTransfer.from_warehouse),
+        joinedload(StockTransfer.to_warehouse),
+        joinedload(StockTransfer.created_by)
+    ).filter(*filters)
+    
+    # Cursor is the id of the last row on the previous page; its transfer_date is
+    # read back in a subquery so the comparison uses the stored value as-is
+    if cursor:
+        try:
+            cursor_id = int(cursor)
+        except ValueError:
+            return jsonify({"msg": "Invalid cursor"}), 400
+        cursor_date = db.session.query(StockTransfer.transfer_date).filter(
+            StockTransfer.id == cursor_id
+        ).scalar_subquery()
+        query = query.filter(or_(
+            StockTransfer.transfer_date < cursor_date,
+            and_(StockTransfer.transfer_date == cursor_date, StockTransfer.id < cursor_id)
+        ))
+    
+    transfers = query.order_by(
+        StockTransfer.transfer_date.desc(),
+        StockTransfer.id.desc()
+    ).limit(limit + 1).all()
+    
+    has_more = len(transfers) > limit
+    transfers = transfers[:limit]
+    next_cursor = str(transfers[-1].id) if has_more else None
     
     return jsonify({
         'success': True,
@@ -224,9 +477,57 @@ def get_transfers():
             'quantity': t.quantity,
             'transfer_date': t.transfer_date.isoformat() if t.transfer_date else None,
             'notes': t.notes,
+            'batch_id': t.batch_id,
             'created_by': t.created_by.full_name if t.created_by else 'Unknown'
         } for t in transfers],
-        'count': len(transfers)
+        'count': len(transfers),
+        'next_cursor': next_cursor
+    })
+
+def _get_transfer_day_summary(filters, limit, cursor):
+    """Transfer totals grouped per product per day, newest day first"""
+    day = func.date(StockTransfer.transfer_date)
+    summary = db.session.query(
+        day.label('day'),
+        StockTransfer.product_id.label('product_id'),
+        func.sum(StockTransfer.quantity).label('quantity'),
+        func.count(StockTransfer.id).label('transfers')
+    ).filter(*filters).group_by(day, StockTransfer.product_id).subquery()
+    
+    query = db.session.query(summary, Product.name, Product.product_code).join(
+        Product, Product.id == summary.c.product_id
+    )
+    
+    # Cursor is '<day>_<product_id>' of the last row on the previous page
+    if cursor:
+        try:
+            cursor_day, cursor_product_id = cursor.rsplit('_', 1)
+            cursor_day, cursor_product_id = date.fromisoformat(cursor_day), int(cursor_product_id)
+        except ValueError:
+            return jsonify({"msg": "Invalid cursor"}), 400
+        query = query.filter(or_(
+            summary.c.day < cursor_day,
+            and_(summary.c.day == cursor_day, summary.c.product_id < cursor_product_id)
+        ))
+    
+    rows = query.order_by(summary.c.day.desc(), summary.c.product_id.desc()).limit(limit + 1).all()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = f'{rows[-1].day}_{rows[-1].product_id}' if has_more else None
+    
+    return jsonify({
+        'success': True,
+        'data': [{
+            'date': str(r.day),
+            'product_id': r.product_id,
+            'product_name': r.name,
+            'product_code': r.product_code,
+            'quantity': int(r.quantity),
+            'transfers': r.transfers
+        } for r in rows],
+        'count': len(rows),
+        'next_cursor': next_cursor
     })
 
 # ============== PRODUCT STOCK BY WAREHOUSE ==============
@@ -256,6 +557,140 @@ def get_product_stock_by_warehouse(product_id):
         }
     })
 
+# ============== REPLENISHMENT ==============
+
+def build_replenishment_plan(window_days, target_days, to_warehouse_id=None):
+    """
+    Propose transfers from intake warehouses to a shipping warehouse.
+    Sales velocity and stock at every relevant warehouse come from one
+    aggregate query; products are ranked by days of cover (lowest first).
+    Returns None if no shipping or intake warehouse is configured.
+    """
+    warehouses = Warehouse.query.filter_by(is_active=True).order_by(Warehouse.id).all()
+    shipping = [w for w in warehouses if w.is_shipping_location]
+    intake = [w for w in warehouses if w.is_default_intake and not w.is_shipping_location]
+    if to_warehouse_id:
+        destination = next((w for w in shipping if w.id == to_warehouse_id), None)
+    else:
+        destination = shipping[0] if shipping else None
+    if not destination or not intake:
+        return None
+    
+    since = datetime.now() - timedelta(days=window_days)
+    sold = db.session.query(
+        SaleItem.product_id.label('product_id'),
+        func.sum(SaleItem.quantity).label('sold')
+    ).join(Sale, Sale.id == SaleItem.sale_id).filter(
+        Sale.sale_date >= since
+    ).group_by(SaleItem.product_id).subquery()
+    
+    shipping_ids = [w.id for w in shipping]
+    stock_columns = [
+        func.coalesce(func.sum(case(
+            (ProductStock.warehouse_id.in_(shipping_ids), ProductStock.quantity), else_=0
+        )), 0).label('shipping_stock')
+    ] + [
+        func.coalesce(func.sum(case(
+            (ProductStock.warehouse_id == w.id, ProductStock.quantity), else_=0
+        )), 0).label(f'w_{w.id}')
+        for w in intake
+    ]
+    rows = db.session.query(
+        Product.id,
+        Product.product_code,
+        Product.name,
+        sold.c.sold,
+        *stock_columns
+    ).join(sold, sold.c.product_id == Product.id).outerjoin(
+        ProductStock, ProductStock.product_id == Product.id
+    ).filter(Product.is_active == True).group_by(Product.id, sold.c.sold).all()
+    
+    lines = []
+    unfilled = []
+    for row in rows:
+        daily_velocity = float(row.sold) / window_days
+        if daily_velocity <= 0:
+            continue
+        shipping_stock = int(row.shipping_stock)
+        days_of_cover = shipping_stock / daily_velocity
+        if days_of_cover >= target_days:
+            continue
+        
+        needed = math.ceil(daily_velocity * target_days) - shipping_stock
+        # Take from the intake warehouse holding the most stock of this product
+        intake_stock, source = max(
+            ((int(getattr(row, f'w_{w.id}')), w) for w in intake),
+            key=lambda pair: pair[0]
+        )
+        quantity = min(needed, intake_stock)
+        entry = {
+            'product_id': row.id,
+            'product_code': row.product_code,
+            'product_name': row.name,
+            'daily_velocity': round(daily_velocity, 3),
+            'shipping_stock': shipping_stock,
+            'intake_stock': intake_stock,
+            'days_of_cover': round(days_of_cover, 1)
+        }
+        if quantity > 0:
+            entry.update({
+                'from_warehouse_id': source.id,
+                'to_warehouse_id': destination.id,
+                'quantity': quantity,
+                'days_of_cover_after': round((shipping_stock + quantity) / daily_velocity, 1)
+            })
+            lines.append(entry)
+        if quantity < needed:
+            unfilled.append(dict(entry, shortfall=needed - max(quantity, 0)))
+    
+    lines.sort(key=lambda l: l['days_of_cover'])
+    unfilled.sort(key=lambda l: l['days_of_cover'])
+    
+    return {
+        'window_days': window_days,
+        'target_days': target_days,
+        'to_warehouse': {'id': destination.id, 'name': destination.name},
+        'lines': lines,
+        'unfilled': unfilled
+    }
+
+@warehouses_bp.route('/replenishment/plan', methods=['GET'])
+@jwt_required()
+def get_replenishment_plan():
+    """
+    Propose a batch of transfers that restocks the shipping warehouse
+    Query params:
+    - window_days: sales history used for velocity (default 30)
+    - target_days: days of cover to restock up to (default 14)
+    - to_warehouse_id: shipping warehouse to restock (default: first one)
+    The returned 'lines' can be posted as-is to /replenishment/execute.
+    """
+    window_days = request.args.get('window_days', 30, type=int)
+    target_days = request.args.get('target_days', 14, type=int)
+    if window_days < 1 or target_days < 1:
+        return jsonify({"msg": "window_days and target_days must be at least 1"}), 400
+    
+    plan = build_replenishment_plan(window_days, target_days, request.args.get('to_warehouse_id', type=int))
+    if plan is None:
+        return jsonify({"msg": "No shipping or intake warehouse configured"}), 404
+    
+    return jsonify({
+        'success': True,
+        'data': plan,
+        'count': len(plan['lines'])
+    })
+
+@warehouses_bp.route('/replenishment/execute', methods=['POST'])
+@jwt_required()
+def execute_replenishment():
+    """
+    Execute a replenishment proposal as one bulk transfer
+    Body: {lines: [...]} as returned by /replenishment/plan (lines may be
+    edited or removed before posting). Stock is re-validated under lock.
+    """
+    data = request.get_json() or {}
+    return _execute_transfer_batch(data, default_notes='Replenishment')
+
 # ============== MIGRATION ENDPOINT ==============
 
 @warehouses_bp.route('/migrate-stock-to-bhaijaan', methods=['POST'])
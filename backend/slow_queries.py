@@ -0,0 +1,205 @@
+"""
+Slow-query log
+Statements slower than SLOW_QUERY_MS (off by default) are logged
+(normalized SQL, redacted parameters, calling route, duration) to the
+"slow_queries" logger on stderr, or to one rotating file per worker process
+with SLOW_QUERY_LOG, and aggregated per statement shape for the admin
+endpoint.
+On PostgreSQL a sample of slow SELECTs is EXPLAINed in a background thread
+(EXPLAIN (ANALYZE, BUFFERS) only with SLOW_QUERY_EXPLAIN_ANALYZE, since that
+runs the statement again) and the plan is logged with its literals redacted.
+"""
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from instrumentation import statement_shape
+
+logger = logging.getLogger('slow_queries')
+
+# Active settings, copied from the app config by init_slow_query_log()
+_settings = {'threshold_ms': 0, 'explain_sample': 0.0, 'explain_analyze': False, 'max_shapes': 500}
+_listeners_installed = False
+
+# {shape: {'count', 'total_ms', 'max_ms', 'last_seen', 'last_route'}} for this worker
+_offenders = {}
+_offenders_lock = threading.Lock()
+
+# One background thread for EXPLAIN; plans are skipped while it is busy
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+_explain_pending = threading.Semaphore(4)
+EXPLAIN_TIMEOUT_MS = 10000
+
+# Plans show the bound values in their conditions: quoted literals, and numbers compared against
+PLAN_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+PLAN_NUMBER_PATTERN = re.compile(r'(\s(?:=|<>|<=|>=|<|>)\s+)-?\d+(?:\.\d+)?\b')
+# Statements that write; ANALYZE would execute them (data-modifying CTEs included)
+WRITE_PATTERN = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE)\b', re.IGNORECASE)
+
+class PerProcessFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler writing to <name>.<pid><ext>
+    Gunicorn workers would otherwise share (and rotate over) one file. The
+    file is opened on the first record, so a handler created in the master
+    before the fork still gets one file per worker.
+    """
+    def __init__(self, path, **kwargs):
+        self._path = os.path.abspath(path)
+        self._pid = None
+        super().__init__(path, delay=True, **kwargs)
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self.acquire()
+            try:
+                if self.stream:
+                    self.stream.close()
+                    self.stream = None
+                self._pid = os.getpid()
+                root, ext = os.path.splitext(self._path)
+                self.baseFilename = f'{root}.{self._pid}{ext}'
+            finally:
+                self.release()
+        super().emit(record)
+
+def redact_parameters(parameters):
+    """Parameter types and sizes without their values"""
+    def redact(value):
+        if value is None:
+            return None
+        if isinstance(value, (str, bytes)):
+            return f'<{type(value).__name__}:{len(value)}>'
+        return f'<{type(value).__name__}>'
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return redact(parameters)
+
+def _calling_route():
+    if not has_request_context():
+        return None
+    return f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+
+def _record_offender(shape, duration_ms, route):
+    with _offenders_lock:
+        entry = _offenders.get(shape)
+        if entry is None:
+            if len(_offenders) >= _settings['max_shapes']:
+                # Make room by forgetting the cheapest shape
+                cheapest = min(_offenders, key=lambda s: _offenders[s]['total_ms'])
+                del _offenders[cheapest]
+            entry = _offenders[shape] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        entry['count'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        entry['last_seen'] = datetime.now().isoformat()
+        entry['last_route'] = route
+
+def top_offenders(limit=20, sort='total_ms'):
+    """Slowest statement shapes seen by this worker, worst first"""
+    with _offenders_lock:
+        rows = [dict(entry, statement=shape) for shape, entry in _offenders.items()]
+    for row in rows:
+        row['total_ms'] = round(row['total_ms'], 2)
+        row['max_ms'] = round(row['max_ms'], 2)
+        row['avg_ms'] = round(row['total_ms'] / row['count'], 2)
+    rows.sort(key=lambda row: row[sort], reverse=True)
+    return rows[:limit]
+
+def clear_offenders():
+    with _offenders_lock:
+        _offenders.clear()
+
+def redact_plan(plan):
+    """Plan text with the literal values in its conditions replaced by ?"""
+    return PLAN_NUMBER_PATTERN.sub(r'\1?', PLAN_STRING_PATTERN.sub("'?'", plan))
+
+def _explain(engine, statement, parameters, shape):
+    """EXPLAIN the statement in a rolled-back transaction and log the redacted plan"""
+    explain = 'EXPLAIN (ANALYZE, BUFFERS)' if _settings['explain_analyze'] else 'EXPLAIN'
+    try:
+        with engine.connect() as conn:
+            conn = conn.execution_options(slow_query_log=False)
+            with conn.begin() as transaction:
+                conn.exec_driver_sql(f'SET LOCAL statement_timeout = {EXPLAIN_TIMEOUT_MS}')
+                rows = conn.exec_driver_sql(f'{explain} {statement}', parameters).all()
+                transaction.rollback()
+        plan = redact_plan('\n'.join(row[0] for row in rows))
+        logger.info(json.dumps({'type': 'plan', 'statement': shape, 'plan': plan}))
+    except Exception as e:
+        logger.info(json.dumps({'type': 'plan_error', 'statement': shape, 'error': str(e)[:300]}))
+    finally:
+        _explain_pending.release()
+
+def _maybe_explain(conn, statement, parameters, executemany, shape):
+    if executemany or conn.dialect.name != 'postgresql' or random.random() >= _settings['explain_sample']:
+        return
+    # ANALYZE executes the statement again, so only read-only statements qualify
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')) or WRITE_PATTERN.search(statement):
+        return
+    if not _explain_pending.acquire(blocking=False):
+        return
+    _explain_executor.submit(_explain, conn.engine, statement, parameters, shape)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.slow_query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    threshold = _settings['threshold_ms']
+    started = getattr(context, 'slow_query_started', None)
+    if not threshold or started is None or not conn.get_execution_options().get('slow_query_log', True):
+        return
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < threshold:
+        return
+    shape = statement_shape(statement)
+    route = _calling_route()
+    _record_offender(shape, duration_ms, route)
+    logger.warning(json.dumps({
+        'type': 'slow_query',
+        'duration_ms': round(duration_ms, 2),
+        'route': route,
+        'statement': shape,
+        'parameters': None if executemany else redact_parameters(parameters),
+        'executemany': executemany,
+    }))
+    _maybe_explain(conn, statement, parameters, executemany, shape)
+
+def init_slow_query_log(app):
+    """Enable the slow-query log if SLOW_QUERY_MS is set (> 0)"""
+    threshold = app.config.get('SLOW_QUERY_MS', 0)
+    if not threshold:
+        return
+    _settings['threshold_ms'] = threshold
+    _settings['explain_sample'] = app.config.get('SLOW_QUERY_EXPLAIN_SAMPLE', 0.0)
+    _settings['explain_analyze'] = app.config.get('SLOW_QUERY_EXPLAIN_ANALYZE', False)
+
+    if not logger.handlers:
+        path = app.config.get('SLOW_QUERY_LOG')
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = PerProcessFileHandler(path, maxBytes=5 * 1024 * 1024, backupCount=3)
+        else:
+            handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(process)d %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
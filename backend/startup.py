@@ -0,0 +1,79 @@
+"""
+Cold-start helpers
+The service scales to zero off-hours, so the first request of the day pays
+for the process start. This module keeps that path short:
+- LazyAppGroup: `flask db` (Flask-Migrate pulls in alembic) is only
+  imported when a CLI command actually needs it, not when a worker imports
+  the app
+- prepare_worker(): per-worker setup for gunicorn (preload_app friendly),
+  including a schema check that stops the worker if `flask bootstrap` has
+  not been run against this database
+- start_warmup(): optionally opens database connections in the background
+  right after boot (WARMUP_ON_START), so the TLS handshake to the database
+  is not on the first request's path
+"""
+import os
+import threading
+import time
+from flask.cli import AppGroup
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+from models import db
+from bootstrap import check_schema
+
+class LazyAppGroup(AppGroup):
+    """app.cli whose expensive command groups are built on first lookup"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaders = {}
+
+    def add_lazy_command(self, name, loader):
+        """loader() must register the command `name` on this group"""
+        self._loaders[name] = loader
+
+    def get_command(self, ctx, name):
+        loader = self._loaders.pop(name, None)
+        if loader is not None:
+            loader()
+        return super().get_command(ctx, name)
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self._loaders))
+
+def warm_up(app):
+    """Configure the ORM mappers and open WARMUP_CONNECTIONS pooled connections"""
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            configure_mappers()
+            connections = [db.engine.connect() for _ in range(app.config.get('WARMUP_CONNECTIONS', 1))]
+            for connection in connections:
+                connection.execute(text('SELECT 1'))
+                # Closing returns the connection to the pool, still open
+                connection.close()
+        print(f"✅ Warm-up done in {(time.perf_counter() - started) * 1000:.0f} ms (pid {os.getpid()})", flush=True)
+    except Exception as e:
+        # The first request will simply connect itself
+        print(f"⚠️ Warm-up failed: {e}", flush=True)
+
+def start_warmup(app):
+    """Run warm_up() in a background thread if WARMUP_ON_START is set; returns the thread or None"""
+    if not app.config.get('WARMUP_ON_START'):
+        return None
+    thread = threading.Thread(target=warm_up, args=(app,), name='db-warmup', daemon=True)
+    thread.start()
+    return thread
+
+def prepare_worker(app):
+    """
+    Per-worker setup, called after the worker has the app loaded
+    With preload_app the app (and its engine) were created in the gunicorn
+    master; pooled connections must never be shared across the fork, and
+    threads do not survive it, so both are handled here instead of at import.
+    Raises RuntimeError if the schema is behind (see check_schema()).
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+    if app.config.get('SCHEMA_CHECK_ON_START', True):
+        check_schema(app)
+    start_warmup(app)
@@ -0,0 +1,501 @@
+"""
+Deterministic synthetic data for the demo database and for scale testing
+SyntheticDataset simulates the shop day by day and yields plain row dicts with
+explicit ids, in foreign-key order; write_dataset() loads them with COPY on
+PostgreSQL and executemany elsewhere. The same seed, scale and `today` always
+produce the same data (only the demo password hash is salted differently).
+"""
+import csv
+import io
+import json
+import random
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import bindparam, column, text, update, values
+from sqlalchemy.types import Integer
+from werkzeug.security import generate_password_hash
+from models import db, User, Warehouse, Product, Customer, Sale, StockIntake, ProductCategory, normalize_phone, parse_year_range
+
+# (make, model, first model year)
+VEHICLES = [
+    ('Honda', 'City', 2014), ('Honda', 'Civic', 2019), ('Honda', 'Amaze', 2018),
+    ('Hyundai', 'Creta', 2015), ('Hyundai', 'Verna', 2017), ('Hyundai', 'Venue', 2019),
+    ('Hyundai', 'i20', 2014), ('Maruti', 'Swift', 2011), ('Maruti', 'Baleno', 2015),
+    ('Maruti', 'Brezza', 2016), ('Maruti', 'Ertiga', 2018), ('Tata', 'Nexon', 2017),
+    ('Tata', 'Harrier', 2019), ('Tata', 'Safari', 2021), ('Tata', 'Altroz', 2020),
+    ('Mahindra', 'XUV700', 2021), ('Mahindra', 'XUV300', 2019), ('Mahindra', 'Scorpio', 2014),
+    ('Mahindra', 'Thar', 2020), ('Toyota', 'Innova Crysta', 2016), ('Toyota', 'Fortuner', 2016),
+    ('Kia', 'Seltos', 2019), ('Kia', 'Sonet', 2020), ('MG', 'Hector', 2019),
+]
+
+# category: (code prefix, label, purchase price range, length range, width range) - inches
+CATEGORIES = {
+    'sunroof': ('SR', 'Sunroof Glass', (6000, 18000), (18, 34), (30, 38)),
+    'windshield': ('WS', 'Windshield', (3500, 12000), (52, 62), (26, 34)),
+    'door_glass': ('DG', 'Door Glass', (900, 3500), (28, 38), (16, 22)),
+    'rear_glass': ('RG', 'Rear Glass', (2500, 8000), (44, 54), (18, 26)),
+    'quarter_glass': ('QG', 'Quarter Glass', (600, 2200), (10, 18), (8, 14)),
+}
+CATEGORY_WEIGHTS = {'sunroof': 4, 'windshield': 3, 'door_glass': 3, 'rear_glass': 2, 'quarter_glass': 1}
+
+SUNROOF_TYPES = ['Mono-Pane', 'Dual-Pane Front', 'Dual-Pane Rear', 'Panoramic']
+CLIP_POSITIONS = ['front', 'rear', 'left', 'right', 'front-left', 'front-right', 'rear-left', 'rear-right']
+
+CUSTOMER_PREFIXES = ['Rajesh', 'Aman', 'Super', 'Shree', 'Balaji', 'Sai', 'New India', 'Royal',
+                     'Galaxy', 'Krishna', 'Metro', 'Star', 'Ganesh', 'Classic', 'Bharat', 'Om']
+CUSTOMER_SUFFIXES = ['Auto Glass', 'Glass Distributors', 'Auto Traders', 'Motors', 'Glass House',
+                     'Car Care', 'Auto Accessories', 'Glass Works']
+CITIES = ['Mumbai', 'Pune', 'Thane', 'Nashik', 'Navi Mumbai', 'Aurangabad', 'Nagpur', 'Surat']
+STREETS = ['Link Road', 'MG Road', 'Station Road', 'LBS Marg', 'Industrial Area', 'Highway Service Road']
+SUPPLIERS = ['GlassCorp India Ltd', 'Saint-Gobain Distributor', 'Asahi Auto Glass Depot',
+             'Mahavir Glass Suppliers', 'Western Auto Glass Imports']
+PAYMENT_METHODS = ['cash', 'upi', 'bank_transfer', 'credit']
+
+# Fixed monthly expenses: (category, amount, description)
+MONTHLY_EXPENSES = [
+    ('rent', 12000.0, 'BhaiJaan warehouse rent'),
+    ('rent', 8000.0, 'Mahapoli shop rent'),
+    ('salary', 18000.0, 'Staff salaries'),
+]
+# Occasional expenses: (category, amount range, description)
+VARIABLE_EXPENSES = [
+    ('transport', (800, 4500), 'Glass transport between warehouses'),
+    ('workers', (500, 2500), 'Loading and fitting labour'),
+    ('utilities', (900, 2600), 'Electricity bill'),
+    ('other', (200, 1800), 'Packing material and sundries'),
+]
+
+# Tables in insertion (foreign-key) order
+TABLE_ORDER = [
+    'user', 'warehouse', 'car_variant', 'product', 'customer', 'stock_intake',
+    'stock_intake_item', 'sale', 'sale_item', 'payment', 'expense', 'expense_monthly_rollup',
+    'stock_transfer', 'product_stock', 'timeline_event'
+]
+
+def _dimension(rng, low, high):
+    """Random dimension in the shop's inches.sixteenths notation, e.g. '19.3'"""
+    return f"{rng.randint(low, high - 1)}.{rng.randint(0, 15)}"
+
+class _Pool:
+    """Ids with O(1) add/discard and random choice, for stock lookups at scale"""
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last] = position
+
+    def __len__(self):
+        return len(self.items)
+
+class SyntheticDataset:
+    """
+    A reproducible history of the shop.
+    - scale: multiplies products (150), customers (60) and daily documents
+    - days: length of the simulated history, ending at today
+    - user_id, warehouse_ids: existing rows to attribute documents to; with
+      include_accounts the demo user and both warehouses are generated too
+    Products get their final stock_quantity once batches() is exhausted
+    (see stock_levels); everything else is written as generated.
+    """
+    def __init__(self, scale=1, seed=42, today=None, days=365, user_id=1,
+                 warehouse_ids=(1, 2), include_accounts=True):
+        self.scale = max(int(scale), 1)
+        self.seed = seed
+        self.today = today or date.today()
+        self.days = days
+        self.user_id = user_id
+        self.intake_warehouse_id, self.shipping_warehouse_id = warehouse_ids
+        self.include_accounts = include_accounts
+        self.stock_levels = {}
+
+    def rows(self):
+        """Every row at once, keyed by table name (fine for the demo scale)"""
+        merged = {name: [] for name in TABLE_ORDER}
+        for batch in self.batches():
+            for name, rows in batch.items():
+                merged[name].extend(rows)
+        return merged
+
+    def batches(self, batch_size=50000):
+        """
+        Yield {table: rows} dicts of roughly batch_size rows. Within a batch
+        tables are in TABLE_ORDER and earlier batches never reference later
+        ones, so each batch can be inserted as soon as it arrives.
+        """
+        rng = random.Random(self.seed)
+        scale = self.scale
+        today = self.today
+        start = today - timedelta(days=self.days - 1)
+        user_id = self.user_id
+        intake_wh, shipping_wh = self.intake_warehouse_id, self.shipping_warehouse_id
+        pending = defaultdict(list)
+        counters = defaultdict(int)
+
+        def next_id(name):
+            counters[name] += 1
+            return counters[name]
+
+        def flush():
+            batch = {name: pending[name] for name in TABLE_ORDER if pending.get(name)}
+            pending.clear()
+            return batch
+
+        if self.include_accounts:
+            pending['user'].append({
+                'id': user_id, 'username': 'demo', 'full_name': 'Demo User',
+                'password_hash': generate_password_hash('demo'), 'can_view_financials': True
+            })
+            pending['warehouse'].extend([
+                {'id': intake_wh, 'code': 'BHAIJAAN', 'name': 'BhaiJaan', 'description': 'Main storage warehouse',
+                 'is_default_intake': True, 'is_shipping_location': False, 'is_active': True},
+                {'id': shipping_wh, 'code': 'MAHAPOLI', 'name': 'Mahapoli', 'description': 'Shipping/dispatch location',
+                 'is_default_intake': False, 'is_shipping_location': True, 'is_active': True},
+            ])
+
+        # Catalog: products, with a car variant for each sunroof
+        categories = list(CATEGORY_WEIGHTS)
+        weights = [CATEGORY_WEIGHTS[c] for c in categories]
+        products = []
+        for product_id in range(1, 150 * scale + 1):
+            category = rng.choices(categories, weights)[0]
+            prefix, label, price_range, length_range, width_range = CATEGORIES[category]
+            make, model, first_year = rng.choice(VEHICLES)
+            year_from = rng.randint(first_year, max(first_year, today.year - 2))
+            year_to = min(year_from + rng.randint(0, 6), today.year)
+            year = str(year_from) if year_from == year_to else f"{year_from}-{year_to}"
+            if rng.random() < 0.1:
+                year = f"{year_from}+"
+            year_range = parse_year_range(year)
+            purchase_price = float(rng.randrange(price_range[0], price_range[1], 50))
+            length = _dimension(rng, *length_range)
+            variant_id = None
+            if category == 'sunroof':
+                variant_id = next_id('car_variant')
+                pending['car_variant'].append({
+                    'id': variant_id,
+                    'car_name': f"{make} {model}",
+                    'name': f"{model} {year}",
+                    'sunroof_type': rng.choice(SUNROOF_TYPES),
+                    'sunroof_length_in': float(length),
+                    'clip_positions': json.dumps(sorted(rng.sample(CLIP_POSITIONS, rng.randint(2, 4))))
+                })
+            products.append({
+                'id': product_id,
+                'product_code': f"{prefix}-{1000 + next_id(prefix)}",
+                'name': f"{make} {model} {year} {label}",
+                'category': ProductCategory(category),
+                'tags': [category, make.lower()],
+                'description': f"{label} for {make} {model} ({year})",
+                'length_mm': length,
+                'width_mm': _dimension(rng, *width_range),
+                'thickness_mm': rng.choice(['4', '5', '6']),
+                'year': year,
+                'year_from': year_range[0],
+                'year_to': year_range[1],
+                'stock_quantity': 0,
+                'low_stock_threshold': rng.choice([2, 3, 5]),
+                'purchase_price': purchase_price,
+                'selling_price': round(purchase_price * rng.uniform(1.2, 1.6), -1),
+                'image_url': None,
+                'is_active': rng.random() > 0.03,
+                'car_variant_id': variant_id,
+            })
+        pending['product'] = products
+
+        customers = pending['customer']
+        phones = set()
+        for customer_id in range(1, 60 * scale + 1):
+            phone = None
+            while phone is None or phone in phones:
+                phone = f"{rng.choice('6789')}{rng.randint(0, 999999999):09d}"
+            phones.add(phone)
+            name = f"{rng.choice(CUSTOMER_PREFIXES)} {rng.choice(CUSTOMER_SUFFIXES)}"
+            customers.append({
+                'id': customer_id,
+                'name': name,
+                'phone': phone,
+                'phone_normalized': normalize_phone(phone),
+                'phone_reversed': normalize_phone(phone)[::-1],
+                'company': f"{name.split()[0]} {rng.choice(['Motors', 'Enterprises', '& Sons', 'Corp'])}",
+                'city': rng.choice(CITIES),
+                'address': f"{rng.randint(1, 200)}, {rng.choice(STREETS)}",
+            })
+        yield flush()
+
+        # Documents, day by day so stock never goes negative
+        stock = defaultdict(int)  # product_id -> total stock
+        warehouse_stock = defaultdict(int)  # (product_id, warehouse_id) -> quantity
+        in_stock = _Pool()  # products with stock_quantity > 0
+        movable = _Pool()  # products with more than one unit in the intake warehouse
+        active_ids = [p['id'] for p in products if p['is_active']]
+        product_by_id = {p['id']: p for p in products}
+        invoice_counters = defaultdict(int)
+        rollup = defaultdict(lambda: [0.0, 0])  # (month, category) -> [total, count]
+        last_payment = datetime.combine(today, time(20, 0))
+
+        def at(day, hour_low=9, hour_high=19):
+            return datetime.combine(day, time(rng.randint(hour_low, hour_high), rng.randint(0, 59)))
+
+        def add_expense(day, category, amount, description, stock_intake_id=None):
+            pending['expense'].append({
+                'id': next_id('expense'), 'date': day, 'category': category, 'amount': amount,
+                'description': description, 'stock_intake_id': stock_intake_id,
+                'created_by_user_id': user_id
+            })
+            totals = rollup[(day.replace(day=1), category)]
+            totals[0] += amount
+            totals[1] += 1
+
+        for offset in range(self.days):
+            day = start + timedelta(days=offset)
+            events = []
+
+            # Stock intake: about twice a week, bigger in the first week to fill the shelves
+            if offset < 7 or rng.random() < 0.3:
+                for _ in range(scale):
+                    intake_id = next_id('stock_intake')
+                    supplier = rng.choice(SUPPLIERS)
+                    lines = rng.sample(active_ids, min(len(active_ids), rng.randint(3, 12) if offset >= 7 else 25))
+                    priced = rng.random() > 0.1
+                    total_cost = 0.0
+                    pending['stock_intake'].append({
+                        'id': intake_id, 'intake_date': day, 'supplier_name': supplier,
+                        'notes': None, 'status': 'completed' if priced else 'pending',
+                        'warehouse_id': intake_wh, 'created_by_user_id': user_id
+                    })
+                    for product_id in lines:
+                        quantity = rng.randint(2, 12)
+                        unit_cost = product_by_id[product_id]['purchase_price'] if priced else None
+                        pending['stock_intake_item'].append({
+                            'id': next_id('stock_intake_item'), 'stock_intake_id': intake_id,
+                            'product_id': product_id, 'quantity': quantity, 'purchase_price_per_unit': unit_cost
+                        })
+                        total_cost += quantity * (unit_cost or 0)
+                        stock[product_id] += quantity
+                        warehouse_stock[(product_id, intake_wh)] += quantity
+                        in_stock.add(product_id)
+                        movable.add(product_id)
+                    if priced:
+                        add_expense(day, 'stock_purchase', total_cost, f"Stock purchase from {supplier}", intake_id)
+                    events.append(('STOCK_INTAKE', at(day, 9, 11), f"Stock intake #{intake_id} from '{supplier}' recorded."))
+
+            # Transfers to the shipping location
+            for _ in range(rng.randint(0, 2 * scale)):
+                if not movable:
+                    break
+                product_id = rng.choice(movable.items)
+                available = warehouse_stock[(product_id, intake_wh)]
+                quantity = rng.randint(1, available // 2)
+                warehouse_stock[(product_id, intake_wh)] -= quantity
+                warehouse_stock[(product_id, shipping_wh)] += quantity
+                if available - quantity <= 1:
+                    movable.discard(product_id)
+                moved_at = at(day, 11, 13)
+                pending['stock_transfer'].append({
+                    'id': next_id('stock_transfer'), 'product_id': product_id,
+                    'from_warehouse_id': intake_wh, 'to_warehouse_id': shipping_wh, 'quantity': quantity,
+                    'transfer_date': moved_at, 'notes': 'Move stock to dispatch', 'batch_id': None,
+                    'created_by_user_id': user_id
+                })
+                events.append(('STOCK_TRANSFER', moved_at,
+                               f"{quantity} x '{product_by_id[product_id]['name']}' moved from BhaiJaan to Mahapoli."))
+
+            # Sales: a few a day, fewer on Sundays
+            for _ in range(rng.randint(0, (5 if day.weekday() < 6 else 2) * scale)):
+                if not in_stock:
+                    break
+                customer = rng.choice(customers) if rng.random() > 0.15 else None
+                sale_id = next_id('sale')
+                invoice_counters[day.year] += 1
+                sold_at = at(day, 10, 20)
+                total = 0.0
+                pending_price = False
+                for product_id in rng.sample(in_stock.items, min(len(in_stock), rng.randint(1, 4))):
+                    quantity = rng.randint(1, min(stock[product_id], 3))
+                    unit_price = product_by_id[product_id]['selling_price'] if rng.random() > 0.05 else None
+                    pending_price = pending_price or unit_price is None
+                    pending['sale_item'].append({
+                        'id': next_id('sale_item'), 'sale_id': sale_id, 'product_id': product_id,
+                        'quantity': quantity, 'unit_price': unit_price
+                    })
+                    stock[product_id] -= quantity
+                    if not stock[product_id]:
+                        in_stock.discard(product_id)
+                    total += quantity * (unit_price or 0)
+                discount = round(total * rng.choice([0, 0, 0, 0.02, 0.05]), -1)
+                total -= discount
+                # Older invoices are more likely to be settled
+                settled = not pending_price and rng.random() < 0.95 - 0.4 * offset / self.days
+                paid = total if settled else round(total * rng.choice([0, 0, 0.25, 0.5]), -1)
+                method = rng.choice(PAYMENT_METHODS)
+                invoice_number = f"INV-{day.year}-{invoice_counters[day.year]:04d}"
+                customer_name = customer['name'] if customer else 'Walk-in Customer'
+                pending['sale'].append({
+                    'id': sale_id,
+                    'invoice_number': invoice_number,
+                    'customer_id': customer['id'] if customer else None,
+                    'customer_name': customer_name,
+                    'customer_phone': customer['phone'] if customer else None,
+                    'customer_company': customer['company'] if customer else None,
+                    'sale_date': sold_at,
+                    'status': 'pending' if pending_price else 'completed',
+                    'payment_status': 'paid' if paid >= total and total > 0 else ('partial' if paid > 0 else 'unpaid'),
+                    'payment_method': method,
+                    'total_amount': total,
+                    'discount_amount': discount,
+                    'amount_paid': paid,
+                    'created_by_user_id': user_id,
+                    'notes': None,
+                })
+                events.append(('SALE_CREATE', sold_at, f"Sale {invoice_number} to '{customer_name}' for ₹{total:,.2f}."))
+                if paid > 0:
+                    pending['payment'].append({
+                        'id': next_id('payment'), 'sale_id': sale_id, 'amount': paid,
+                        'payment_date': min(sold_at + timedelta(days=rng.randint(0, 20)), last_payment),
+                        'payment_method': method, 'notes': None, 'created_by_user_id': user_id
+                    })
+
+            # Expenses
+            if day.day == 1:
+                for category, amount, description in MONTHLY_EXPENSES:
+                    add_expense(day, category, amount, f"{description} - {day:%B %Y}")
+            for _ in range(scale):
+                if rng.random() < 0.25:
+                    category, (low, high), description = rng.choice(VARIABLE_EXPENSES)
+                    add_expense(day, category, float(rng.randrange(low, high, 50)), description)
+
+            events.sort(key=lambda e: e[1])
+            pending['timeline_event'].extend(
+                {'id': next_id('timeline_event'), 'event_type': event_type, 'timestamp': timestamp,
+                 'user_id': user_id, 'description': description}
+                for event_type, timestamp, description in events
+            )
+            if sum(len(rows) for rows in pending.values()) >= batch_size:
+                yield flush()
+
+        # Derived data
+        self.stock_levels = {pid: quantity for pid, quantity in stock.items() if quantity}
+        for product in products:
+            product['stock_quantity'] = stock[product['id']]
+        pending['product_stock'] = [
+            {'id': i, 'product_id': pid, 'warehouse_id': wid, 'quantity': quantity}
+            for i, ((pid, wid), quantity) in enumerate(sorted(warehouse_stock.items()), start=1)
+        ]
+        pending['expense_monthly_rollup'] = [
+            {'id': i, 'month': month, 'category': category, 'total': total, 'expense_count': count}
+            for i, ((month, category), (total, count)) in enumerate(sorted(rollup.items()), start=1)
+        ]
+        yield flush()
+
+# ============== LOADING ==============
+
+def _copy_rows(connection, table, rows):
+    """PostgreSQL COPY ... FROM STDIN, with values converted by the column types"""
+    dialect = connection.dialect
+    columns = list(rows[0])
+    processors = [table.c[name].type.bind_processor(dialect) for name in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        record = []
+        for name, processor in zip(columns, processors):
+            value = row[name]
+            if processor is not None and value is not None:
+                value = processor(value)
+            record.append(r'\N' if value is None else value)
+        writer.writerow(record)
+    buffer.seek(0)
+    column_list = ', '.join(dialect.identifier_preparer.quote(name) for name in columns)
+    statement = f"COPY {dialect.identifier_preparer.format_table(table)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+
+def bulk_insert(connection, table, rows, chunk_size=10000):
+    """Insert rows with COPY on PostgreSQL (psycopg2) and executemany elsewhere"""
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2':
+        _copy_rows(connection, table, rows)
+        return
+    for i in range(0, len(rows), chunk_size):
+        connection.execute(table.insert(), rows[i:i + chunk_size])
+
+def write_dataset(connection, dataset, batch_size=50000):
+    """
+    Load a SyntheticDataset through connection (inside its transaction).
+    Returns {table: row count}. Rows bypass the ORM, so session listeners
+    (timeline capture, cache invalidation) do not fire.
+    """
+    counts = defaultdict(int)
+    tables = db.metadata.tables
+    for batch in dataset.batches(batch_size):
+        for name, rows in batch.items():
+            bulk_insert(connection, tables[name], rows)
+            counts[name] += len(rows)
+
+    # Stock is only known once the whole history has been simulated
+    product = tables['product']
+    levels = sorted(dataset.stock_levels.items())
+    if connection.dialect.name == 'postgresql':
+        for i in range(0, len(levels), 5000):
+            stock = values(column('id', Integer), column('quantity', Integer), name='stock').data(levels[i:i + 5000])
+            connection.execute(
+                update(product).where(product.c.id == stock.c.id)
+                .values(stock_quantity=stock.c.quantity, updated_at=product.c.updated_at)
+            )
+    elif levels:
+        connection.execute(
+            update(product).where(product.c.id == bindparam('product_id'))
+            .values(stock_quantity=bindparam('quantity'), updated_at=product.c.updated_at),
+            [{'product_id': pid, 'quantity': quantity} for pid, quantity in levels]
+        )
+
+    # Explicit ids leave PostgreSQL sequences behind
+    if connection.dialect.name == 'postgresql':
+        for name in counts:
+            connection.execute(
+                text(f"SELECT setval(pg_get_serial_sequence(:table, 'id'), (SELECT MAX(id) FROM {connection.dialect.identifier_preparer.quote(name)}))"),
+                {'table': f'"{name}"' if name == 'user' else name}
+            )
+    return {name: counts[name] for name in TABLE_ORDER if name in counts}
+
+def seed_database(scale=1, years=1, seed=42, batch_size=50000):
+    """
+    Load a SyntheticDataset into the app's (empty) database, attributed to an
+    existing user and the default warehouses. Returns ({table: rows}, username).
+    Raises ValueError if the database is not ready for seeding.
+    """
+    if any(model.query.first() for model in (Product, Customer, Sale, StockIntake)):
+        raise ValueError("Database already has products, customers, sales or intakes; seed an empty database.")
+    user = User.query.filter_by(username='abby').first() or User.query.order_by(User.id).first()
+    if not user:
+        raise ValueError("No users found; run `flask bootstrap` first.")
+    intake = Warehouse.query.filter_by(code='BHAIJAAN').first()
+    shipping = Warehouse.query.filter_by(code='MAHAPOLI').first()
+    if not intake or not shipping:
+        raise ValueError("Default warehouses missing; run `flask bootstrap` first.")
+
+    dataset = SyntheticDataset(
+        scale=scale, seed=seed, days=365 * years, user_id=user.id,
+        warehouse_ids=(intake.id, shipping.id), include_accounts=False
+    )
+    username = user.username
+    db.session.close()
+    with db.engine.begin() as connection:
+        counts = write_dataset(connection, dataset, batch_size=batch_size)
+    return counts, username
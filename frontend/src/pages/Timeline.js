@@ -9,6 +9,13 @@ import {
 import ShoppingCartIcon from '@mui/icons-material/ShoppingCart';
 import api from '../services/api';
 
+// SALE_CREATE -> "Sale Create"
+const formatEventType = (type) => (type || '')
+    .toLowerCase()
+    .split('_')
+    .map(word => word.charAt(0).toUpperCase() + word.slice(1))
+    .join(' ');
+
 const ActivityTimeline = () => {
     const [events, setEvents] = useState([]);
     const [loading, setLoading] = useState(true);
@@ -18,7 +25,7 @@ const ActivityTimeline = () => {
             setLoading(true);
             try {
                 const response = await api.get('/timeline');
-                setEvents(response.data);
+                setEvents(response.data.data || []);
             } catch (error) {
                 console.error("Failed to fetch timeline events:", error);
             }
@@ -36,9 +43,9 @@ const ActivityTimeline = () => {
             ) : (
                 <Timeline position="alternate">
                     {events.map((event, index) => (
-                        <TimelineItem key={index}>
+                        <TimelineItem key={event.id}>
                             <TimelineOppositeContent color="text.secondary">
-                                {new Date(event.date).toLocaleString()}
+                                {new Date(event.timestamp).toLocaleString()}
                             </TimelineOppositeContent>
                             <TimelineSeparator>
                                 <TimelineDot color="primary" variant="outlined">
@@ -48,8 +55,9 @@ const ActivityTimeline = () => {
                             </TimelineSeparator>
                             <TimelineContent sx={{ py: '12px', px: 2 }}>
                                 <Paper elevation={3} sx={{ p: 2 }}>
-                                    <Typography variant="h6" component="span">Sale Recorded</Typography>
-                                    <Typography>{event.details}</Typography>
+                                    <Typography variant="h6" component="span">{formatEventType(event.event_type)}</Typography>
+                                    <Typography>{event.description}</Typography>
+                                    {event.user_name && <Typography variant="caption" color="text.secondary">by {event.user_name}</Typography>}
                                 </Paper>
                             </TimelineContent>
                         </TimelineItem>